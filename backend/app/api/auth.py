@@ -1,15 +1,35 @@
-﻿from fastapi import APIRouter, HTTPException, Depends, Header
+﻿from fastapi import APIRouter, HTTPException, Depends, Header, Request
 from pydantic import BaseModel, EmailStr
-from typing import Optional
-from datetime import datetime
+from typing import Optional, Dict, Any
+from dataclasses import dataclass
+import logging
+import time
 import uuid
-import jwt  # PyJWT or python-jose compatible import
+import jwt  # PyJWT
+from cachetools import TTLCache
 
 from app.config import settings
-from app.services.db_service import get_db_service
-from app.utils.security import hash_password, verify_password, create_access_token
+from app.services.db_service import get_db_service, get_async_db_service
+from app.utils.security import (
+    DUMMY_PASSWORD_HASH,
+    hash_password_async,
+    verify_password_async,
+    create_access_token,
+    JWT_VERIFYING_KEY,
+    token_cache_key,
+)
+from app.utils.rate_limit import RateLimiter
+from app.utils.helpers import db_endpoint, generate_timestamp
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Caps how much bcrypt work login attempts can trigger. The per-IP budget
+# gates every attempt (it is looser because a whole club often logs in from
+# the same network); the per-account budget only counts failed passwords,
+# so posting someone's email can't lock them out of a correct login.
+_login_limit_by_email = RateLimiter([(5, 60), (20, 3600)])
+_login_limit_by_ip = RateLimiter([(20, 60), (100, 3600)])
 
 # ============= REQUEST / RESPONSE MODELS =============
 
@@ -49,244 +69,280 @@ class SignupResponse(BaseModel):
 # ============= AUTH ENDPOINTS =============
 
 @router.post("/login", response_model=LoginResponse)
-async def login(request: LoginRequest):
+@db_endpoint
+async def login(
+    request: LoginRequest,
+    http_request: Request,
+    db=Depends(get_db_service),
+):
     """
     Login with email + password. Requires that the user already belongs to a group.
     """
-    try:
-        db = get_db_service()
-
-        # Find user by email
-        user = db.get_user_by_email(request.email)
-        if not user:
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-
-        # Verify password
-        if not verify_password(request.password, user.get("password_hash", "")):
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-
-        # Get user's group membership (assume one active group for now)
-        membership = db.get_user_membership(user["user_id"])
-        if not membership:
-            raise HTTPException(
-                status_code=404,
-                detail="User is not associated with any team yet",
-            )
-
-        # Create JWT token
-        token_data = {
-            "user_id": user["user_id"],
-            "email": user["email"],
-            "group_id": membership["group_id"],
-            "role": membership["role"],
-        }
-        token = create_access_token(token_data)
-
-        return LoginResponse(
-            userId=user["user_id"],
-            displayName=user.get("display_name"),
-            groupId=membership["group_id"],
-            role=membership["role"],
-            token=token,
+    client_ip = http_request.client.host if http_request.client else "unknown"
+    email_key = request.email.lower()
+    if not _login_limit_by_ip.hit(client_ip) or _login_limit_by_email.exhausted(email_key):
+        raise HTTPException(
+            status_code=429,
+            detail="Too many login attempts, try again later",
+            headers={"Retry-After": "60"},
+        )
+
+    # Find user by email
+    user = db.get_user_by_email(request.email)
+    if not user:
+        # Spend the same bcrypt time as a real check before failing
+        await verify_password_async(request.password, DUMMY_PASSWORD_HASH)
+        _login_limit_by_email.record(email_key)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Verify password
+    if not await verify_password_async(request.password, user.get("password_hash", "")):
+        _login_limit_by_email.record(email_key)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # Get user's group membership (assume one active group for now)
+    membership = db.get_user_membership(user["user_id"])
+    if not membership:
+        raise HTTPException(
+            status_code=404,
+            detail="User is not associated with any team yet",
         )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        # Surface a generic error to the client, but log details server-side
-        raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
+    # Create JWT token
+    token_data = {
+        "user_id": user["user_id"],
+        "email": user["email"],
+        "group_id": membership["group_id"],
+        "role": membership["role"],
+    }
+    token = create_access_token(token_data)
+
+    return LoginResponse(
+        userId=user["user_id"],
+        displayName=user.get("display_name"),
+        groupId=membership["group_id"],
+        role=membership["role"],
+        token=token,
+    )
 
 
 @router.post("/signup", response_model=SignupResponse)
-async def signup(request: SignupRequest):
+@db_endpoint
+async def signup(request: SignupRequest, db=Depends(get_db_service)):
     """
     Signup endpoint - creates new user and either:
     1. Creates new group (if groupName provided) - user becomes admin
     2. Joins existing group (if inviteCode provided) - user becomes member
     """
-    try:
-        db = get_db_service()
-
-        # Check if user already exists
-        existing_user = db.get_user_by_email(request.email)
-        if existing_user:
-            raise HTTPException(status_code=400, detail="User already exists")
-
-        # Validate that either groupName or inviteCode is provided (but not both)
-        if not request.groupName and not request.inviteCode:
-            raise HTTPException(
-                status_code=400,
-                detail="Either groupName or inviteCode must be provided",
-            )
-
-        if request.groupName and request.inviteCode:
-            raise HTTPException(
-                status_code=400,
-                detail="Provide either groupName or inviteCode, not both",
-            )
-
-        # Create user
-        user_id = str(uuid.uuid4())
-        password_hash = hash_password(request.password)
-        now = datetime.utcnow().isoformat()
-
-        user_data = {
-            "user_id": user_id,
-            "email": request.email,
-            "display_name": request.name,
-            "password_hash": password_hash,
+    # Check if user already exists
+    existing_user = db.get_user_by_email(request.email)
+    if existing_user:
+        raise HTTPException(status_code=400, detail="User already exists")
+
+    # Validate that either groupName or inviteCode is provided (but not both)
+    if not request.groupName and not request.inviteCode:
+        raise HTTPException(
+            status_code=400,
+            detail="Either groupName or inviteCode must be provided",
+        )
+
+    if request.groupName and request.inviteCode:
+        raise HTTPException(
+            status_code=400,
+            detail="Provide either groupName or inviteCode, not both",
+        )
+
+    # Create user
+    user_id = uuid.uuid4().hex
+    password_hash = await hash_password_async(request.password)
+    now = generate_timestamp()
+
+    user_data = {
+        "user_id": user_id,
+        "email": request.email,
+        "display_name": request.name,
+        "password_hash": password_hash,
+        "created_at": now,
+    }
+
+    # Handle group creation or joining
+    if request.groupName:
+        # Create new group - user becomes admin
+        group_data = {
+            "name": request.groupName,
+            "created_by": user_id,
             "created_at": now,
         }
-
-        print(f"Creating user: {user_id}, email: {request.email}")
-        db.create_user(user_data)
-        print(f"✓ User created successfully")
-
-        # Handle group creation or joining
-        group_code: Optional[str] = None
-
-        if request.groupName:
-            # Create new group - user becomes admin
-            print(f"Creating group: {request.groupName}")
-            group_id = db.create_group(
-                {
-                    "name": request.groupName,
-                    "created_by": user_id,
-                    "created_at": now,
-                }
-            )
-            print(f"✓ Group created: group_id={group_id}")
-
-            # Generate invite code for the group
-            print(f"Generating invite code for group {group_id}")
-            group_code = db.generate_group_invite_code(group_id)
-            print(f"✓ Invite code generated: {group_code}")
-
-            # Add user as admin
-            print(f"Adding user {user_id} to group {group_id} as admin")
-            db.add_group_member(
-                {
-                    "group_id": group_id,
-                    "user_id": user_id,
-                    "role": "admin",
-                    "joined_at": now,
-                    # status/balance defaulted in LocalDBService
-                }
-            )
-            print(f"✓ User added to group successfully")
-
-            role = "admin"
-
-        else:
-            # Join existing group - user becomes member via invite code
-            group = db.get_group_by_invite_code(request.inviteCode)
-            if not group:
-                raise HTTPException(status_code=404, detail="Invalid invite code")
-
-            group_id = group["group_id"]
-
-            db.add_group_member(
-                {
-                    "group_id": group_id,
-                    "user_id": user_id,
-                    "role": "member",
-                    "joined_at": now,
-                }
-            )
-
-            role = "member"
-
-        # Create JWT token
-        token_data = {
-            "user_id": user_id,
-            "email": request.email,
+        group_id = None
+        role = "admin"
+
+    else:
+        # Join existing group - user becomes member via invite code
+        group = db.get_group_by_invite_code(request.inviteCode)
+        if not group:
+            raise HTTPException(status_code=404, detail="Invalid invite code")
+
+        group_data = None
+        group_id = group["group_id"]
+        role = "member"
+
+    # User, group (with invite code) and membership land together or not at all
+    result = db.signup_atomic(
+        user_data,
+        group_data,
+        {
             "group_id": group_id,
+            "user_id": user_id,
             "role": role,
-        }
-        token = create_access_token(token_data)
-
-        return SignupResponse(
-            userId=user_id,
-            groupId=group_id,
-            role=role,
-            groupCode=group_code,
-            token=token,
-        )
+            "joined_at": now,
+        },
+    )
+    group_id = result["group_id"]
+    group_code: Optional[str] = result["invite_code"]
+    logger.info("signup ok", extra={"user_id": user_id, "group_id": group_id})
+
+    # Create JWT token
+    token_data = {
+        "user_id": user_id,
+        "email": request.email,
+        "group_id": group_id,
+        "role": role,
+    }
+    token = create_access_token(token_data)
+
+    return SignupResponse(
+        userId=user_id,
+        groupId=group_id,
+        role=role,
+        groupCode=group_code,
+        token=token,
+    )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        import traceback
 
-        # Log the full error for debugging in CloudWatch
-        traceback.print_exc()
-        print(f"SIGNUP ERROR: {type(e).__name__}: {str(e)}")
+# ============= CURRENT USER / JWT HELPERS =============
 
-        # Return a proper HTTP error with details
-        raise HTTPException(
-            status_code=500,
-            detail=f"Signup failed: {type(e).__name__}: {str(e)}"
-        )
+@dataclass(frozen=True)
+class Claims:
+    """
+    Identity carried by the JWT. group_id/role are only a snapshot from
+    when the token was issued; authorization goes through
+    get_caller_membership, which reflects role changes and removals.
+    """
+    user_id: str
+    email: Optional[str] = None
+    group_id: Optional[int] = None
+    role: Optional[str] = None
 
 
-# ============= CURRENT USER / JWT HELPERS =============
+# One decoder for the process, plus recently verified tokens (keyed by a
+# digest of the token) so repeat requests skip parsing and signature checks
+_jwt = jwt.PyJWT()
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+
 
-async def get_current_user_id(authorization: str = Header(None)):
+def _decode_token(token: str) -> Claims:
     """
-    Extract user_id from JWT token in Authorization header.
+    Verify a raw JWT and return its Claims, serving repeat tokens from
+    _token_cache. Raises on any invalid token.
+    """
+    key = token_cache_key(token)
+    cached = _token_cache.get(key)
+    # Never serve a cached token past its own exp
+    if cached is not None and (cached[1] is None or cached[1] > time.time()):
+        return cached[0]
+
+    payload = _jwt.decode(
+        token,
+        JWT_VERIFYING_KEY,
+        algorithms=[settings.JWT_ALGORITHM],
+    )
+    user_id = payload.get("user_id")
+
+    if not user_id:
+        raise jwt.InvalidTokenError("Token has no user_id")
+
+    claims = Claims(
+        user_id=user_id,
+        email=payload.get("email"),
+        group_id=payload.get("group_id"),
+        role=payload.get("role"),
+    )
+    _token_cache[key] = (claims, payload.get("exp"))
+    return claims
+
+
+async def get_claims(authorization: str = Header(None)) -> Claims:
+    """
+    Decode the JWT in the Authorization header into Claims.
     Expecting: Authorization: Bearer <token>
     """
     if not authorization:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
-    try:
-        token = authorization.replace("Bearer ", "").strip()
-        if not token:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        # Works for both PyJWT and python-jose style jwt.decode
-        payload = jwt.decode(
-            token,
-            settings.JWT_SECRET_KEY,
-            algorithms=[settings.JWT_ALGORITHM],
-        )
-        user_id = payload.get("user_id")
-
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-
-        return user_id
+    token = authorization[7:] if authorization.startswith("Bearer ") else authorization
+    token = token.strip()
+    if not token:
+        raise HTTPException(status_code=401, detail="Invalid token")
 
-    except HTTPException:
-        raise
+    try:
+        return _decode_token(token)
     except Exception:
         # Any decode/verification error → treat as invalid token
         raise HTTPException(status_code=401, detail="Invalid token")
 
 
-@router.get("/me")
-async def get_current_user(user_id: str = Depends(get_current_user_id)):
+def decode_ws_token(token: str) -> Optional[Claims]:
     """
-    Get current authenticated user information.
+    Claims for a WebSocket ?token=..., or None if the token is invalid.
+    Only the identity is used; the socket's group is looked up on connect.
     """
     try:
-        db = get_db_service()
-        user = db.get_user_by_id(user_id)
+        return _decode_token(token)
+    except Exception:
+        return None
 
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
 
-        membership = db.get_user_membership(user_id)
+async def get_current_user_id(claims: Claims = Depends(get_claims)) -> str:
+    """
+    Extract user_id from JWT token in Authorization header.
+    """
+    return claims.user_id
 
-        return {
-            "user_id": user["user_id"],
-            "email": user["email"],
-            "display_name": user.get("display_name"),
-            "group_id": membership["group_id"] if membership else None,
-            "role": membership["role"] if membership else None,
-        }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_caller_membership(
+    request: Request,
+    user_id: str = Depends(get_current_user_id),
+    db=Depends(get_async_db_service),
+) -> Optional[Dict[str, Any]]:
+    """
+    The caller's group membership (None if not in a group), looked up once
+    per request. Also stashed on request.state.user_id / .membership.
+    """
+    membership = await db.get_user_membership(user_id)
+    request.state.user_id = user_id
+    request.state.membership = membership
+    return membership
+
+
+@router.get("/me")
+@db_endpoint
+async def get_current_user(
+    claims: Claims = Depends(get_claims),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service),
+):
+    """
+    Get current authenticated user information.
+    """
+    user = db.get_user_by_id(claims.user_id)
+
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return {
+        "user_id": user["user_id"],
+        "email": user["email"],
+        "display_name": user.get("display_name"),
+        "group_id": membership["group_id"] if membership else None,
+        "role": membership["role"] if membership else None,
+    }
@@ -1,49 +1,145 @@
 from fastapi import APIRouter, HTTPException, Depends, WebSocket, WebSocketDisconnect
-from pydantic import BaseModel
-from typing import List, Optional, Dict
-from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
+from typing import List, Optional, Dict, Set
+from dataclasses import dataclass
+import asyncio
+import logging
 import uuid
 import json
+import orjson
 
 from app.services.db_service import get_db_service
-from app.api.auth import get_current_user_id
+from app.utils.helpers import db_endpoint, generate_timestamp
+from app.api.auth import Claims, get_claims, get_caller_membership, decode_ws_token
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+def serialize(message: dict) -> str:
+    """Encode a WS event once; the same text frame goes to every recipient."""
+    return orjson.dumps(message).decode()
+
+
+@dataclass(eq=False)
+class WSCtx:
+    """Per-connection state, resolved once when the socket connects."""
+    ws: WebSocket
+    user_id: str
+    group_id: int
+    display_name: str
+
 
 # WebSocket connection manager
 class ConnectionManager:
+    # Events for a group are held this long so a burst goes out as one frame;
+    # a full batch wakes the group's flush task right away to bound latency
+    FLUSH_DELAY = 0.015
+    MAX_BATCH = 50
+
     def __init__(self):
-        # Dict[group_id, List[WebSocket]]
-        self.active_connections: Dict[int, List[WebSocket]] = {}
+        # Dict[group_id, Set[WSCtx]]
+        self.active_connections: Dict[int, Set[WSCtx]] = {}
+        # Serialized events waiting for the group's next flush
+        self._pending: Dict[int, List[str]] = {}
+        # One flush task per group with pending events, and the event that
+        # cuts its FLUSH_DELAY wait short
+        self._flush_tasks: Dict[int, asyncio.Task] = {}
+        self._wake: Dict[int, asyncio.Event] = {}
     
-    async def connect(self, websocket: WebSocket, group_id: int):
-        await websocket.accept()
-        if group_id not in self.active_connections:
-            self.active_connections[group_id] = []
-        self.active_connections[group_id].append(websocket)
+    async def connect(self, ctx: WSCtx):
+        await ctx.ws.accept()
+        self.active_connections.setdefault(ctx.group_id, set()).add(ctx)
     
-    def disconnect(self, websocket: WebSocket, group_id: int):
-        if group_id in self.active_connections:
-            if websocket in self.active_connections[group_id]:
-                self.active_connections[group_id].remove(websocket)
+    def disconnect(self, ctx: WSCtx):
+        connections = self.active_connections.get(ctx.group_id)
+        if connections is not None:
+            connections.discard(ctx)
+            if not connections:
+                del self.active_connections[ctx.group_id]
     
     async def broadcast_to_group(self, group_id: int, message: dict):
         if group_id in self.active_connections:
-            disconnected = []
-            for connection in self.active_connections[group_id]:
-                try:
-                    await connection.send_json(message)
-                except:
-                    disconnected.append(connection)
-            
-            # Remove disconnected clients
-            for conn in disconnected:
-                self.disconnect(conn, group_id)
+            await self.broadcast_raw(group_id, serialize(message))
+
+    async def broadcast_raw(self, group_id: int, payload: str):
+        """
+        Queue an already-serialized JSON event for the group's next flush.
+        Never sends itself, so a slow socket can't stall the caller.
+        """
+        if group_id not in self.active_connections:
+            return
+
+        pending = self._pending.setdefault(group_id, [])
+        pending.append(payload)
+
+        if group_id not in self._flush_tasks:
+            self._wake[group_id] = asyncio.Event()
+            self._flush_tasks[group_id] = asyncio.create_task(self._flush_loop(group_id))
+        if len(pending) >= self.MAX_BATCH:
+            self._wake[group_id].set()
+
+    async def _flush_loop(self, group_id: int):
+        """
+        The group's only sender: waits FLUSH_DELAY (or until a full batch
+        wakes it), flushes, and repeats while events keep arriving. Frames
+        for a group therefore go out one at a time and in order.
+        """
+        wake = self._wake[group_id]
+        try:
+            while self._pending.get(group_id):
+                if len(self._pending[group_id]) < self.MAX_BATCH:
+                    try:
+                        await asyncio.wait_for(wake.wait(), self.FLUSH_DELAY)
+                    except asyncio.TimeoutError:
+                        pass
+                wake.clear()
+                await self._flush(group_id)
+        finally:
+            del self._flush_tasks[group_id]
+            del self._wake[group_id]
+
+    async def _flush(self, group_id: int):
+        pending = self._pending.get(group_id)
+        if not pending:
+            return
+        items = pending[:self.MAX_BATCH]
+        del pending[:self.MAX_BATCH]
+        if not pending:
+            del self._pending[group_id]
+
+        # A lone event goes out as-is; bursts are packed into one batch frame.
+        # Items are already JSON, so the batch is built without re-encoding.
+        if len(items) == 1:
+            frame = items[0]
+        else:
+            frame = '{"type":"batch","items":[' + ",".join(items) + ']}'
+
+        await self._send(group_id, frame)
+
+    async def _send(self, group_id: int, frame: str):
+        # Snapshot so connects/disconnects during the sends don't mutate the set
+        connections = list(self.active_connections.get(group_id, ()))
+        if not connections:
+            return
+
+        # Send to everyone concurrently so one slow client can't stall the rest
+        results = await asyncio.gather(
+            *(connection.ws.send_text(frame) for connection in connections),
+            return_exceptions=True,
+        )
+
+        # Remove disconnected clients
+        for connection, result in zip(connections, results):
+            if isinstance(result, Exception):
+                self.disconnect(connection)
 
 manager = ConnectionManager()
 
 # Request/Response Models
 class MessageResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     message_id: str
     group_id: int
     user_id: str
@@ -52,165 +148,176 @@ class MessageResponse(BaseModel):
     created_at: str
 
 class SendMessageRequest(BaseModel):
-    content: str
+    content: str = Field(min_length=1, max_length=4000)
+
+    @field_validator('content')
+    @classmethod
+    def strip_content(cls, v: str) -> str:
+        v = v.strip()
+        if not v:
+            raise ValueError("Message cannot be empty")
+        return v
 
 
 @router.get("/messages", response_model=List[MessageResponse])
+@db_endpoint
 async def get_messages(
     limit: int = 50,
     before: Optional[str] = None,
-    user_id: str = Depends(get_current_user_id)
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service)
 ):
     """
     Get chat messages for user's group
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        
-        # Get messages
-        messages = db.get_group_messages(group_id, limit=limit, before=before)
-        
-        # Convert to response models
-        message_list = []
-        for message in messages:
-            message_list.append(MessageResponse(**message))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    
+    # Get messages
+    messages = db.get_group_messages(group_id, limit=limit, before=before)
 
-        return message_list
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Resolve author names with one batched lookup instead of one per message
+    users = db.get_users_by_ids([message['user_id'] for message in messages])
+
+    for message in messages:
+        user = users.get(message['user_id'])
+        if user:
+            message['user_name'] = user.get('display_name') or user['email']
+
+    # Message rows/items are stored with exactly the MessageResponse
+    # fields, so they're encoded as-is (response_model only documents
+    # them) with no per-page validate/dump pass
+    return ORJSONResponse(content=messages)
 
 
 @router.post("/messages", response_model=MessageResponse)
+@db_endpoint
 async def send_message(
     request: SendMessageRequest,
-    user_id: str = Depends(get_current_user_id)
+    claims: Claims = Depends(get_claims),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service)
 ):
     """
     Send a chat message
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        
-        # Validate message
-        if not request.content or not request.content.strip():
-            raise HTTPException(status_code=400, detail="Message cannot be empty")
-        
-        # Create message
-        message_id = str(uuid.uuid4())
-        message_data = {
-            'message_id': message_id,
-            'group_id': group_id,
-            'user_id': user_id,
-            'content': request.content.strip(),
-            'created_at': datetime.utcnow().isoformat()
-        }
-        
-        db.create_message(message_data)
+    user_id = claims.user_id
+    
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    
+    user = db.get_user_by_id(user_id) or {}
 
-        # Get created message (user_name is already included by db service)
-        message = db.get_message_by_id(message_id)
+    # Create message
+    message_id = uuid.uuid4().hex
+    message_data = {
+        'message_id': message_id,
+        'group_id': group_id,
+        'user_id': user_id,
+        'user_name': user.get('display_name') or user.get('email') or claims.email or 'Unknown',
+        'content': request.content,
+        'created_at': generate_timestamp()
+    }
+    
+    db.create_message(message_data)
 
-        response = MessageResponse(**message)
-        
-        # Broadcast to WebSocket clients
-        await manager.broadcast_to_group(group_id, {
-            "type": "new_message",
-            "message": response.dict()
-        })
-        
-        return response
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Broadcast to WebSocket clients (plain dict, no model round-trip)
+    await manager.broadcast_to_group(group_id, {
+        "type": "new_message",
+        "message": message_data
+    })
+    
+    # The inserted row is fully known here, so build the response from it
+    return MessageResponse.model_validate(message_data)
 
 
 @router.delete("/messages/{message_id}")
-async def delete_message(message_id: str, user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def delete_message(
+    message_id: str,
+    claims: Claims = Depends(get_claims),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service)
+):
     """
     Delete a message (author or admin only)
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        is_admin = membership['role'] == 'admin'
-        
-        # Get message
-        message = db.get_message_by_id(message_id)
-        if not message:
-            raise HTTPException(status_code=404, detail="Message not found")
-        
-        # Verify message belongs to user's group
-        if message['group_id'] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Check permissions (admin or author)
-        if not is_admin and message['user_id'] != user_id:
-            raise HTTPException(status_code=403, detail="Permission denied")
-        
-        # Delete message
-        db.delete_message(message_id)
-        
-        # Broadcast deletion to WebSocket clients
-        await manager.broadcast_to_group(group_id, {
-            "type": "message_deleted",
-            "message_id": message_id
-        })
-        
-        return {"ok": True, "message": "Message deleted successfully"}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    user_id = claims.user_id
+    
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    is_admin = membership['role'] == 'admin'
+    
+    # Get message
+    message = db.get_message_by_id(message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    
+    # Verify message belongs to user's group
+    if message['group_id'] != group_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check permissions (admin or author)
+    if not is_admin and message['user_id'] != user_id:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    
+    # Delete message
+    db.delete_message(message_id)
+    
+    # Broadcast deletion to WebSocket clients
+    await manager.broadcast_to_group(group_id, {
+        "type": "message_deleted",
+        "message_id": message_id
+    })
+    
+    return {"ok": True, "message": "Message deleted successfully"}
 
 
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket, token: str):
+async def websocket_endpoint(websocket: WebSocket, token: str, db=Depends(get_db_service)):
     """
     WebSocket endpoint for real-time chat
     Connect with: ws://localhost:8000/api/chat/ws?token=<jwt_token>
     """
     try:
         # Verify token and get user
-        import jwt
-        from app.config import settings
-        
-        try:
-            payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-            user_id = payload.get('user_id')
-            group_id = payload.get('group_id')
-            
-            if not user_id or not group_id:
-                await websocket.close(code=1008, reason="Invalid token")
-                return
-        except jwt.JWTError:
+        claims = decode_ws_token(token)
+        if claims is None:
             await websocket.close(code=1008, reason="Invalid token")
             return
+
+        user_id = claims.user_id
+
+        # The token only proves identity; the group comes from the current
+        # membership so removed members can't (re)join their old group's chat
+        membership = db.get_user_membership(user_id)
+        if not membership:
+            await websocket.close(code=1008, reason="Not a group member")
+            return
+        group_id = membership['group_id']
         
+        # Resolve the sender's name once; messages and typing events reuse it
+        user = db.get_user_by_id(user_id) or {}
+        ctx = WSCtx(
+            ws=websocket,
+            user_id=user_id,
+            group_id=group_id,
+            display_name=user.get('display_name') or user.get('email') or claims.email or 'Unknown',
+        )
+        typing_payload = serialize({
+            "type": "user_typing",
+            "user_id": user_id,
+            "user_name": ctx.display_name
+        })
+
         # Connect to WebSocket
-        await manager.connect(websocket, group_id)
+        await manager.connect(ctx)
         
         try:
             # Send connection confirmation
@@ -230,49 +337,54 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
                     
                     # Handle different message types
                     if message_data.get('type') == 'send_message':
-                        content = message_data.get('content', '').strip()
-                        
-                        if content:
-                            db = get_db_service()
-                            
-                            # Create message
-                            message_id = str(uuid.uuid4())
-                            new_message = {
-                                'message_id': message_id,
-                                'group_id': group_id,
-                                'user_id': user_id,
-                                'content': content,
-                                'created_at': datetime.utcnow().isoformat()
-                            }
-
-                            # Create message (returns message with user_name included)
-                            created_message = db.create_message(new_message)
-
-                            # Broadcast to all group members
-                            await manager.broadcast_to_group(group_id, {
-                                "type": "new_message",
-                                "message": created_message
-                            })
-                    
-                    elif message_data.get('type') == 'typing':
-                        # Broadcast typing indicator
-                        db = get_db_service()
-                        user = db.get_user_by_id(user_id)
-                        
+                        # Same validation as the REST endpoint
+                        content = SendMessageRequest.model_validate(message_data).content
+
+                        # Re-checked per message (served from membership_cache,
+                        # which removals drop) so an open socket stops posting
+                        # once its user leaves the group
+                        membership = db.get_user_membership(user_id)
+                        if not membership or membership['group_id'] != group_id:
+                            await websocket.close(code=1008, reason="Not a group member")
+                            raise WebSocketDisconnect(code=1008)
+
+                        # Create message
+                        message_id = uuid.uuid4().hex
+                        new_message = {
+                            'message_id': message_id,
+                            'group_id': group_id,
+                            'user_id': user_id,
+                            'user_name': ctx.display_name,
+                            'content': content,
+                            'created_at': generate_timestamp()
+                        }
+
+                        # Create message (returns message with user_name included)
+                        created_message = db.create_message(new_message)
+
+                        # Broadcast to all group members
                         await manager.broadcast_to_group(group_id, {
-                            "type": "user_typing",
-                            "user_id": user_id,
-                            "user_name": user.get('display_name', user['email']) if user else 'Unknown'
+                            "type": "new_message",
+                            "message": created_message
                         })
+                    
+                    elif message_data.get('type') == 'typing':
+                        # Broadcast typing indicator (encoded once at connect)
+                        await manager.broadcast_raw(group_id, typing_payload)
                 
                 except json.JSONDecodeError:
                     await websocket.send_json({
                         "type": "error",
                         "message": "Invalid message format"
                     })
+                except ValidationError:
+                    await websocket.send_json({
+                        "type": "error",
+                        "message": "Message must be 1-4000 characters"
+                    })
         
         except WebSocketDisconnect:
-            manager.disconnect(websocket, group_id)
+            manager.disconnect(ctx)
             
             # Broadcast user disconnected
             await manager.broadcast_to_group(group_id, {
@@ -281,7 +393,7 @@ async def websocket_endpoint(websocket: WebSocket, token: str):
             })
     
     except Exception as e:
-        print(f"WebSocket error: {str(e)}")
+        logger.exception("WebSocket error: %s", e)
         try:
             await websocket.close(code=1011, reason="Internal server error")
         except:
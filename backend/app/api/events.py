@@ -1,16 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Optional
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from pydantic import BaseModel, ConfigDict
+from typing import List, Literal, Optional, Tuple
+from datetime import date, datetime, time
 import uuid
 
-from app.services.db_service import get_db_service
-from app.api.auth import get_current_user_id
+from app.services.db_service import get_async_db_service
+from app.api.auth import get_caller_membership
+from app.utils.helpers import db_endpoint
+from app.utils.http_cache import group_view_cache
 
 router = APIRouter()
 
+# Checked by pydantic-core on the request models (invalid values get a 422)
+EventType = Literal['PRACTICE', 'GAME', 'MEETING', 'OTHER']
+
 # Request/Response Models
 class EventResponse(BaseModel):
+    # List endpoints return DB rows directly (response_model documents
+    # them); frozen since instances are never mutated
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     event_id: str
     group_id: int
     title: str
@@ -25,268 +34,249 @@ class EventResponse(BaseModel):
 class CreateEventRequest(BaseModel):
     title: str
     description: Optional[str] = None
-    event_date: str  # YYYY-MM-DD
-    event_time: str  # HH:MM
+    # Parsed by pydantic-core (malformed values get a 422); stored as the
+    # YYYY-MM-DD / HH:MM text that listings sort and page on
+    event_date: date
+    event_time: time
     location: Optional[str] = None
-    event_type: str = "PRACTICE"  # PRACTICE, GAME, MEETING, OTHER
+    event_type: EventType = "PRACTICE"
 
 class UpdateEventRequest(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
-    event_date: Optional[str] = None
-    event_time: Optional[str] = None
+    event_date: Optional[date] = None
+    event_time: Optional[time] = None
     location: Optional[str] = None
-    event_type: Optional[str] = None
+    event_type: Optional[EventType] = None
+
+
+def _time_text(value: time) -> str:
+    return value.strftime("%H:%M")
 
 
 @router.get("/", response_model=List[EventResponse])
+@db_endpoint
 async def get_events(
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
+    http_request: Request,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
     event_type: Optional[str] = None,
-    user_id: str = Depends(get_current_user_id)
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
 ):
     """
     Get all events for user's group with optional filtering
     """
-    try:
-        db = get_db_service()
-        
-        # Get user's group
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        
-        # Get events with filters
-        events = db.get_group_events(
-            group_id,
-            start_date=start_date,
-            end_date=end_date,
-            event_type=event_type
-        )
-        
-        return [EventResponse(**event) for event in events]
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+
+    group_id = membership['group_id']
+
+    # Unchanged since the client's (or this process's) last copy: skip the
+    # query and serialization entirely
+    version = await db.get_group_version(group_id)
+    etag = group_view_cache.etag("events", group_id, version, start_date, end_date, event_type)
+    cached = group_view_cache.lookup(http_request, etag)
+    if cached is not None:
+        return cached
+
+    # Get events with filters
+    events = await db.get_group_events(
+        group_id,
+        start_date=start_date.isoformat() if start_date else None,
+        end_date=end_date.isoformat() if end_date else None,
+        event_type=event_type
+    )
+
+    # Rows already have exactly the EventResponse fields, so they are
+    # encoded as-is (no model pass) and cached under the ETag
+    return group_view_cache.store(etag, events)
+
+
+def _encode_cursor(event: dict) -> str:
+    return f"{event['event_date']}|{event['event_time']}|{event['event_id']}"
+
+
+def _decode_cursor(cursor: str) -> Tuple[str, str, str]:
+    parts = cursor.split("|")
+    if len(parts) != 3:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return parts[0], parts[1], parts[2]
 
 
 @router.get("/upcoming", response_model=List[EventResponse])
+@db_endpoint
 async def get_upcoming_events(
-    limit: int = 10,
-    user_id: str = Depends(get_current_user_id)
+    http_request: Request,
+    limit: int = Query(10, ge=1, le=100),
+    after: Optional[str] = None,
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
 ):
     """
-    Get upcoming events for user's group
+    Get upcoming events for user's group.
+
+    Keyset-paginated: a full page carries an X-Next-Cursor header; pass it
+    back as ?after= for the next page.
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        today = datetime.utcnow().date().isoformat()
-        
-        events = db.get_group_events(
-            group_id,
-            start_date=today,
-            limit=limit
-        )
-        
-        return [EventResponse(**event) for event in events]
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+
+    group_id = membership['group_id']
+    today = datetime.utcnow().date().isoformat()
+
+    version = await db.get_group_version(group_id)
+    etag = group_view_cache.etag("upcoming", group_id, version, today, limit, after)
+    cached = group_view_cache.lookup(http_request, etag)
+    if cached is not None:
+        return cached
+
+    events = await db.get_group_events(
+        group_id,
+        start_date=today,
+        limit=limit,
+        after=_decode_cursor(after) if after else None
+    )
+
+    headers = {}
+    if len(events) == limit:
+        headers["X-Next-Cursor"] = _encode_cursor(events[-1])
+
+    return group_view_cache.store(etag, events, headers)
 
 
 @router.get("/{event_id}", response_model=EventResponse)
-async def get_event(event_id: str, user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_event(
+    event_id: str,
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Get specific event details
     """
-    try:
-        db = get_db_service()
-        
-        # Get user's group
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        
-        # Get event
-        event = db.get_event_by_id(event_id)
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Verify event belongs to user's group
-        if event['group_id'] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        return EventResponse(**event)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+
+    group_id = membership['group_id']
+
+    # Get event
+    event = await db.get_event_by_id(event_id)
+    if not event:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    # Verify event belongs to user's group
+    if event['group_id'] != group_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    return EventResponse.model_validate(event)
 
 
 @router.post("/", response_model=EventResponse)
+@db_endpoint
 async def create_event(
     request: CreateEventRequest,
-    user_id: str = Depends(get_current_user_id)
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
 ):
     """
     Create new event (admin only)
     """
-    try:
-        db = get_db_service()
-        
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Admin access required")
-        
-        group_id = membership['group_id']
-        
-        # Validate event type
-        valid_types = ['PRACTICE', 'GAME', 'MEETING', 'OTHER']
-        if request.event_type not in valid_types:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid event type. Must be one of: {', '.join(valid_types)}"
-            )
-        
-        # Create event
-        event_id = str(uuid.uuid4())
-        event_data = {
-            'event_id': event_id,
-            'group_id': group_id,
-            'title': request.title,
-            'description': request.description,
-            'event_date': request.event_date,
-            'event_time': request.event_time,
-            'location': request.location,
-            'event_type': request.event_type,
-            'created_by': user_id,
-            'created_at': datetime.utcnow().isoformat()
-        }
-        
-        db.create_event(event_data)
-        
-        # Return created event
-        event = db.get_event_by_id(event_id)
-        return EventResponse(**event)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Check if user is admin
+    if not membership or membership['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership['group_id']
+
+    # Create event
+    event_id = uuid.uuid4().hex
+    event_data = {
+        'event_id': event_id,
+        'group_id': group_id,
+        'title': request.title,
+        'description': request.description,
+        'event_date': request.event_date.isoformat(),
+        'event_time': _time_text(request.event_time),
+        'location': request.location,
+        'event_type': request.event_type,
+        'created_by': membership['user_id'],
+        'created_at': datetime.utcnow().isoformat()
+    }
+
+    # create_event hands back the stored row, so no re-read is needed
+    event = await db.create_event(event_data)
+    return EventResponse.model_validate(event)
+
+
+async def _raise_event_not_accessible(db, event_id: str) -> None:
+    """
+    A group-scoped write matched nothing: 404 if the event doesn't exist,
+    403 if it belongs to another group. Only runs on the failure path.
+    """
+    if not await db.get_event_by_id(event_id):
+        raise HTTPException(status_code=404, detail="Event not found")
+    raise HTTPException(status_code=403, detail="Access denied")
 
 
 @router.put("/{event_id}", response_model=EventResponse)
+@db_endpoint
 async def update_event(
     event_id: str,
     request: UpdateEventRequest,
-    user_id: str = Depends(get_current_user_id)
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
 ):
     """
     Update event (admin only)
     """
-    try:
-        db = get_db_service()
-        
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Admin access required")
-        
-        group_id = membership['group_id']
-        
-        # Get event
-        event = db.get_event_by_id(event_id)
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Verify event belongs to user's group
-        if event['group_id'] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Validate event type if provided
-        if request.event_type:
-            valid_types = ['PRACTICE', 'GAME', 'MEETING', 'OTHER']
-            if request.event_type not in valid_types:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid event type. Must be one of: {', '.join(valid_types)}"
-                )
-        
-        # Update event
-        update_data = {}
-        if request.title is not None:
-            update_data['title'] = request.title
-        if request.description is not None:
-            update_data['description'] = request.description
-        if request.event_date is not None:
-            update_data['event_date'] = request.event_date
-        if request.event_time is not None:
-            update_data['event_time'] = request.event_time
-        if request.location is not None:
-            update_data['location'] = request.location
-        if request.event_type is not None:
-            update_data['event_type'] = request.event_type
-        
-        if update_data:
-            db.update_event(event_id, update_data)
-        
-        # Return updated event
-        event = db.get_event_by_id(event_id)
-        return EventResponse(**event)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@router.delete("/{event_id}")
-async def delete_event(event_id: str, user_id: str = Depends(get_current_user_id)):
+    # Check if user is admin
+    if not membership or membership['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership['group_id']
+
+    # Update event
+    update_data = {}
+    if request.title is not None:
+        update_data['title'] = request.title
+    if request.description is not None:
+        update_data['description'] = request.description
+    if request.event_date is not None:
+        update_data['event_date'] = request.event_date.isoformat()
+    if request.event_time is not None:
+        update_data['event_time'] = _time_text(request.event_time)
+    if request.location is not None:
+        update_data['location'] = request.location
+    if request.event_type is not None:
+        update_data['event_type'] = request.event_type
+
+    # Scoped to the caller's group, so the write itself is the access
+    # check; it returns the updated row, or {} if nothing matched
+    event = await db.update_event(event_id, update_data, group_id=group_id)
+    if not event:
+        await _raise_event_not_accessible(db, event_id)
+
+    return EventResponse.model_validate(event)
+
+
+@router.delete("/{event_id}", status_code=204, response_class=Response)
+@db_endpoint
+async def delete_event(
+    event_id: str,
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Delete event (admin only)
     """
-    try:
-        db = get_db_service()
-        
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Admin access required")
-        
-        group_id = membership['group_id']
-        
-        # Get event
-        event = db.get_event_by_id(event_id)
-        if not event:
-            raise HTTPException(status_code=404, detail="Event not found")
-        
-        # Verify event belongs to user's group
-        if event['group_id'] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Delete event
-        db.delete_event(event_id)
-        
-        return {"ok": True, "message": "Event deleted successfully"}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    # Check if user is admin
+    if not membership or membership['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership['group_id']
+
+    # Delete only within the caller's group
+    if not await db.delete_event(event_id, group_id=group_id):
+        await _raise_event_not_accessible(db, event_id)
+
+    return Response(status_code=204)
\ No newline at end of file
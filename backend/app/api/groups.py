@@ -1,15 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Request
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from datetime import datetime
 
-from app.services.db_service import get_db_service
-from app.api.auth import get_current_user_id
+from app.services.db_service import get_async_db_service
+from app.api.auth import get_caller_membership
+from app.utils.helpers import db_endpoint
+from app.utils.http_cache import group_view_cache
 
 router = APIRouter()
 
 # Request/Response Models
 class GroupResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     group_id: int
     name: str
     description: Optional[str] = None
@@ -22,168 +26,145 @@ class UpdateGroupRequest(BaseModel):
     description: Optional[str] = None
 
 class GenerateInviteCodeResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     invite_code: str
 
 
 @router.get("/", response_model=GroupResponse)
-async def get_my_group(user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_my_group(
+    http_request: Request,
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Get current user's group information
     """
-    try:
-        db = get_db_service()
-        
-        # Get user's membership
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        # Get group details
-        group = db.get_group_by_id(membership['group_id'])
-        if not group:
-            raise HTTPException(status_code=404, detail="Group not found")
-        
-        # Get member count
-        member_count = db.get_group_member_count(group['group_id'])
-        
-        # Get or generate invite code
-        invite_code = db.get_group_invite_code(group['group_id'])
-        if not invite_code:
-            invite_code = db.generate_group_invite_code(group['group_id'])
-        
-        return GroupResponse(
-            group_id=group['group_id'],
-            name=group['name'],
-            description=group.get('description'),
-            invite_code=invite_code,
-            created_at=group['created_at'],
-            member_count=member_count
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+
+    group_id = membership['group_id']
+
+    version = await db.get_group_version(group_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    etag = group_view_cache.etag("group", group_id, version)
+    cached = group_view_cache.lookup(http_request, etag)
+    if cached is not None:
+        return cached
+
+    # The group row carries a denormalized member_count, so one read does
+    group = await db.get_group_by_id(group_id)
+    if not group:
+        raise HTTPException(status_code=404, detail="Group not found")
+
+    # The group row carries the invite code; only generate one if missing
+    invite_code = group.get('invite_code') or await db.ensure_group_invite_code(group_id)
+
+    return group_view_cache.store(etag, GroupResponse(
+        group_id=group['group_id'],
+        name=group['name'],
+        description=group.get('description'),
+        invite_code=invite_code,
+        created_at=group['created_at'],
+        member_count=group['member_count']
+    ).model_dump())
 
 
 @router.put("/", response_model=GroupResponse)
+@db_endpoint
 async def update_group(
     request: UpdateGroupRequest,
-    user_id: str = Depends(get_current_user_id)
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
 ):
     """
     Update group information (admin only)
     """
-    try:
-        db = get_db_service()
-        
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Admin access required")
-        
-        group_id = membership['group_id']
-        
-        # Update group
-        update_data = {}
-        if request.name:
-            update_data['name'] = request.name
-        if request.description is not None:
-            update_data['description'] = request.description
-        
-        if update_data:
-            db.update_group(group_id, update_data)
-        
-        # Get updated group
-        group = db.get_group_by_id(group_id)
-        member_count = db.get_group_member_count(group_id)
-        invite_code = db.get_group_invite_code(group_id)
-        
-        return GroupResponse(
-            group_id=group['group_id'],
-            name=group['name'],
-            description=group.get('description'),
-            invite_code=invite_code,
-            created_at=group['created_at'],
-            member_count=member_count
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Check if user is admin
+    if not membership or membership['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership['group_id']
+
+    # Update group
+    update_data = {}
+    if request.name:
+        update_data['name'] = request.name
+    if request.description is not None:
+        update_data['description'] = request.description
+
+    if update_data:
+        await db.update_group(group_id, update_data)
+
+    # Get updated group (member_count included)
+    group = await db.get_group_by_id(group_id)
+    invite_code = group.get('invite_code') or await db.ensure_group_invite_code(group_id)
+
+    return GroupResponse(
+        group_id=group['group_id'],
+        name=group['name'],
+        description=group.get('description'),
+        invite_code=invite_code,
+        created_at=group['created_at'],
+        member_count=group['member_count']
+    )
 
 
 @router.post("/invite-code", response_model=GenerateInviteCodeResponse)
-async def regenerate_invite_code(user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def regenerate_invite_code(
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Generate new invite code for group (admin only)
     """
-    try:
-        db = get_db_service()
-        
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Admin access required")
-        
-        group_id = membership['group_id']
-        
-        # Generate new invite code
-        invite_code = db.generate_group_invite_code(group_id, regenerate=True)
-        
-        return GenerateInviteCodeResponse(invite_code=invite_code)
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Check if user is admin
+    if not membership or membership['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership['group_id']
+
+    # Generate new invite code
+    invite_code = await db.generate_group_invite_code(group_id, regenerate=True)
+
+    return GenerateInviteCodeResponse(invite_code=invite_code)
 
 
 @router.get("/settings")
-async def get_group_settings(user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_group_settings(
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Get group settings (admin only)
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership or membership['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Admin access required")
-        
-        group_id = membership['group_id']
-        settings = db.get_group_settings(group_id)
-        
-        return settings or {}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership or membership['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership['group_id']
+    settings = await db.get_group_settings(group_id)
+
+    return settings or {}
 
 
 @router.put("/settings")
+@db_endpoint
 async def update_group_settings(
     settings: dict,
-    user_id: str = Depends(get_current_user_id)
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
 ):
     """
     Update group settings (admin only)
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership or membership['role'] != 'admin':
-            raise HTTPException(status_code=403, detail="Admin access required")
-        
-        group_id = membership['group_id']
-        db.update_group_settings(group_id, settings)
-        
-        return {"ok": True, "message": "Settings updated"}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    if not membership or membership['role'] != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership['group_id']
+    await db.update_group_settings(group_id, settings)
+
+    return {"ok": True, "message": "Settings updated"}
\ No newline at end of file
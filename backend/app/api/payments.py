@@ -1,16 +1,25 @@
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict
+from typing import List, Literal, Optional, Dict, Any
+from datetime import date, datetime
 import uuid
 
-from app.services.db_service import get_db_service
-from app.api.auth import get_current_user_id
+from app.services.db_service import get_async_db_service
+from app.api.auth import get_current_user_id, get_caller_membership
+from app.utils.helpers import db_endpoint, json_array_stream
+from app.utils.http_cache import group_view_cache
 
 router = APIRouter()
 
+# Checked by pydantic-core on the request models (invalid values get a 422)
+PaymentType = Literal["CHARGE", "CREDIT"]
+PaymentStatus = Literal["PENDING", "PAID", "OVERDUE"]
+
 # Request/Response Models
 class PaymentResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     payment_id: str
     group_id: int
     user_id: str
@@ -29,15 +38,16 @@ class CreatePaymentRequest(BaseModel):
     user_id: str
     amount: float
     description: str
-    payment_type: str = "CHARGE"  # CHARGE or CREDIT
-    due_date: Optional[str] = None
+    payment_type: PaymentType = "CHARGE"
+    # Parsed by pydantic-core (malformed dates get a 422), stored as YYYY-MM-DD
+    due_date: Optional[date] = None
 
 
 class BulkChargeRequest(BaseModel):
     user_ids: List[str]
     amount: float
     description: str
-    due_date: Optional[str] = None
+    due_date: Optional[date] = None
 
 
 class BulkCreditRequest(BaseModel):
@@ -47,517 +57,430 @@ class BulkCreditRequest(BaseModel):
 
 
 class UpdatePaymentStatusRequest(BaseModel):
-    status: str  # PENDING, PAID, OVERDUE
+    status: PaymentStatus
 
 
 class MemberBalanceResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     user_id: str
     user_name: str
     balance: float
 
 
 class PaymentStatisticsResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     total_money_owed: float  # Sum of all unpaid charges
     total_money_collected: float  # Sum of all paid charges
     total_payments_count: int  # Total number of payment records
 
 
-def _build_payment_response(payment: Dict[str, Any], db) -> PaymentResponse:
+
+def _payment_payload(
+    payment: Dict[str, Any], user: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
     """
-    Helper to build PaymentResponse while avoiding duplicate 'user_name'
-    keyword args. We completely ignore any 'user_name' column stored in
-    the payments table and derive it from the users table instead.
+    Plain dict with exactly the PaymentResponse fields, encoded as the
+    response body as-is (PaymentResponse only documents it, so no model
+    is built or validated per payment). We completely
+    ignore any 'user_name' column stored in the payments table and derive
+    it from the payer's user row instead (looked up by the caller, batched
+    via db.get_users_by_ids when building many responses).
     """
-    user = db.get_user_by_id(payment["user_id"])
     user_name = (
-        user.get("display_name", user["email"]) if user else "Unknown"
+        (user.get("display_name") or user["email"]) if user else "Unknown"
     )
 
-    # Remove any user_name coming from the DB row
-    clean_payment = {k: v for k, v in payment.items() if k != "user_name"}
+    return {
+        "payment_id": payment["payment_id"],
+        "group_id": payment["group_id"],
+        "user_id": payment["user_id"],
+        "user_name": user_name,
+        "amount": float(payment["amount"]),
+        "description": payment["description"],
+        "payment_type": payment["payment_type"],
+        "status": payment["status"],
+        "due_date": payment.get("due_date"),
+        "paid_date": payment.get("paid_date"),
+        "created_by": payment["created_by"],
+        "created_at": payment["created_at"],
+    }
+
 
-    return PaymentResponse(**clean_payment, user_name=user_name)
+def _joined_payload(payment: Dict[str, Any]) -> Dict[str, Any]:
+    """_payment_payload for a row that carries the payer's email/display_name."""
+    return _payment_payload(payment, payment if payment.get("email") else None)
 
 
 @router.get("/", response_model=List[PaymentResponse])
+@db_endpoint
 async def get_payments(
+    http_request: Request,
     user_id_filter: Optional[str] = None,
     status: Optional[str] = None,
     user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service),
 ):
     """
     Get payments for user's group
     - Admin can see all payments
     - Members can only see their own payments
     """
-    try:
-        db = get_db_service()
-
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-
-        group_id = membership["group_id"]
-        is_admin = membership["role"] == "admin"
-
-        # If not admin, only show user's own payments
-        if not is_admin:
-            user_id_filter = user_id
-
-        # Get payments
-        payments = db.get_group_payments(
-            group_id,
-            user_id=user_id_filter,
-            status=status,
-        )
-
-        # Build responses
-        payment_list = [
-            _build_payment_response(payment, db) for payment in payments
-        ]
-        return payment_list
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+
+    group_id = membership["group_id"]
+    is_admin = membership["role"] == "admin"
+
+    # If not admin, only show user's own payments
+    if not is_admin:
+        user_id_filter = user_id
+
+    # Revalidation only: the list is streamed rather than kept in the body
+    # cache, so a matching If-None-Match is the cheap path
+    version = await db.get_payments_version(group_id)
+    etag = group_view_cache.etag("payments", group_id, version, user_id_filter, status)
+    not_modified = group_view_cache.not_modified(http_request, etag)
+    if not_modified is not None:
+        return not_modified
+
+    # Get payments
+    payments = await db.get_group_payments(
+        group_id,
+        user_id=user_id_filter,
+        status=status,
+    )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Resolve every payer in one batched lookup, then shape and encode rows
+    # as the body streams out: returning a response skips FastAPI's
+    # jsonable_encoder and response_model validation passes, and a large
+    # group's list is never held fully shaped and encoded at once
+    users = await db.get_users_by_ids([payment["user_id"] for payment in payments])
+    return StreamingResponse(
+        json_array_stream(
+            _payment_payload(payment, users.get(payment["user_id"]))
+            for payment in payments
+        ),
+        media_type="application/json",
+        headers=group_view_cache.headers(etag),
+    )
 
 
 @router.get("/balances", response_model=List[MemberBalanceResponse])
-async def get_member_balances(user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_member_balances(
+    http_request: Request,
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Get balance for all members (admin only)
-    Balance = sum of CREDITS - sum of PENDING/OVERDUE CHARGES
-    Negative balance means member owes money
+    Balance = sum of PENDING/OVERDUE CHARGES - sum of CREDITS
+    Positive balance means member owes money
     """
-    try:
-        db = get_db_service()
-
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership["role"] != "admin":
-            raise HTTPException(status_code=403, detail="Admin access required")
-
-        group_id = membership["group_id"]
-
-        # Get all members
-        members = db.get_group_members(group_id)
-
-        balances: List[MemberBalanceResponse] = []
-        for member in members:
-            user = db.get_user_by_id(member["user_id"])
-            if not user:
-                continue
-
-            # Calculate balance
-            balance = db.get_user_balance(member["user_id"], group_id)
-
-            balances.append(
-                MemberBalanceResponse(
-                    user_id=member["user_id"],
-                    user_name=user.get("display_name", user["email"]),
-                    balance=balance,
-                )
-            )
-
-        return balances
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Check if user is admin
+    if not membership or membership["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership["group_id"]
+
+    version = await db.get_payments_version(group_id)
+    etag = group_view_cache.etag("balances", group_id, version)
+    cached = group_view_cache.lookup(http_request, etag)
+    if cached is not None:
+        return cached
+
+    # One query: member rows carry the user's email/display_name and the
+    # running balance that the payments triggers keep current
+    members = await db.get_group_members(group_id)
+
+    # Encoded as plain dicts, like get_payments
+    return group_view_cache.store(etag, [
+        {
+            "user_id": member["user_id"],
+            "user_name": member.get("display_name") or member["email"],
+            "balance": float(member.get("balance") or 0.0),
+        }
+        for member in members
+        if member.get("email")
+    ])
 
 
 @router.get("/my-balance")
-async def get_my_balance(user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_my_balance(
+    user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service),
+):
     """
     Get current user's balance
     """
-    try:
-        db = get_db_service()
-
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-
-        group_id = membership["group_id"]
-        balance = db.get_user_balance(user_id, group_id)
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
 
-        return {"balance": balance}
+    group_id = membership["group_id"]
+    balance = await db.get_user_balance(user_id, group_id)
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return {"balance": balance}
 
 
 @router.get("/statistics", response_model=PaymentStatisticsResponse)
-async def get_payment_statistics(user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_payment_statistics(
+    http_request: Request,
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Get payment statistics for the group (admin only)
     - total_money_owed: Sum of all member balances (positive balances only)
     - total_money_collected: Sum of all paid charges
     - total_payments_count: Total number of payment records
     """
-    try:
-        db = get_db_service()
-
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership["role"] != "admin":
-            raise HTTPException(status_code=403, detail="Admin access required")
-
-        group_id = membership["group_id"]
-
-        # Get all members and sum their positive balances
-        members = db.get_group_members(group_id)
-        total_money_owed = 0.0
-        for member in members:
-            balance = db.get_user_balance(member["user_id"], group_id)
-            if balance > 0:  # Only count positive balances (money owed)
-                total_money_owed += balance
-
-        # Get all payments for collected amount and count
-        all_payments = db.get_group_payments(group_id)
-        total_money_collected = 0.0
-        total_payments_count = len(all_payments)
-
-        for payment in all_payments:
-            payment_type = payment["payment_type"]
-            status = payment["status"]
-            amount = float(payment["amount"])
-
-            # Only count PAID CHARGE payments for collected calculations
-            if payment_type == "CHARGE" and status == "PAID":
-                total_money_collected += amount
-
-        return PaymentStatisticsResponse(
-            total_money_owed=total_money_owed,
-            total_money_collected=total_money_collected,
-            total_payments_count=total_payments_count,
-        )
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    # Check if user is admin
+    if not membership or membership["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership["group_id"]
+
+    version = await db.get_payments_version(group_id)
+    etag = group_view_cache.etag("statistics", group_id, version)
+    cached = group_view_cache.lookup(http_request, etag)
+    if cached is not None:
+        return cached
+
+    # Owed, collected and count aggregated by the storage layer; the row's
+    # keys are exactly the PaymentStatisticsResponse fields
+    return group_view_cache.store(etag, await db.get_payment_statistics(group_id))
 
 
 @router.get("/{payment_id}", response_model=PaymentResponse)
-async def get_payment(payment_id: str, user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_payment(
+    payment_id: str,
+    user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Get specific payment details
     """
-    try:
-        db = get_db_service()
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
 
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
+    group_id = membership["group_id"]
+    is_admin = membership["role"] == "admin"
 
-        group_id = membership["group_id"]
-        is_admin = membership["role"] == "admin"
-
-        # Get payment
-        payment = db.get_payment_by_id(payment_id)
-        if not payment:
-            raise HTTPException(status_code=404, detail="Payment not found")
-
-        # Verify payment belongs to user's group
-        if payment["group_id"] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-
-        # Non-admin can only view their own payments
-        if not is_admin and payment["user_id"] != user_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-
-        return _build_payment_response(payment, db)
+    # Payment and payer's name in one read, scoped to the caller's group
+    # (and to their own payments for non-admins): a miss means "not yours"
+    payment = await db.get_payment_scoped(
+        payment_id, group_id, user_id=None if is_admin else user_id
+    )
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return ORJSONResponse(content=_joined_payload(payment))
 
 
 @router.post("/", response_model=PaymentResponse)
+@db_endpoint
 async def create_payment(
     request: CreatePaymentRequest,
     user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service),
 ):
     """
     Create new payment/charge (admin only)
     """
-    try:
-        db = get_db_service()
-
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership["role"] != "admin":
-            raise HTTPException(status_code=403, detail="Admin access required")
-
-        group_id = membership["group_id"]
+    # Check if user is admin
+    if not membership or membership["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
+
+    group_id = membership["group_id"]
+
+    # Verify target user is in group; the bundle also carries their name
+    target = await db.get_member_bundle(group_id, request.user_id)
+    if not target:
+        raise HTTPException(status_code=404, detail="User not in your group")
+
+    # Create payment
+    payment_id = uuid.uuid4().hex
+    payment_data = {
+        "payment_id": payment_id,
+        "group_id": group_id,
+        "user_id": request.user_id,
+        "user_name": target.get("display_name") or target["email"],
+        "amount": request.amount,
+        "description": request.description,
+        "payment_type": request.payment_type,
+        "status": "PENDING",
+        "due_date": request.due_date.isoformat() if request.due_date else None,
+        "created_by": user_id,
+        "created_at": datetime.utcnow().isoformat(),
+    }
+
+    # create_payment hands back the stored row, so no re-read is needed
+    payment = await db.create_payment(payment_data)
+    return ORJSONResponse(content=_payment_payload(payment, target))
+
+
+async def _create_bulk_payments(
+    db,
+    group_id: int,
+    user_ids: List[str],
+    created_by: str,
+    fields: Dict[str, Any],
+) -> ORJSONResponse:
+    """
+    Insert one payment per member of user_ids (ids not in the group are
+    skipped) with the shared fields (amount, type, status, dates, ...),
+    and return their payloads.
+    """
+    if not user_ids:
+        raise HTTPException(status_code=400, detail="No users selected")
 
-        # Validate payment type
-        if request.payment_type not in ["CHARGE", "CREDIT"]:
-            raise HTTPException(status_code=400, detail="Invalid payment type")
+    # One query for every target's membership + profile
+    members = await db.get_member_bundles(group_id, user_ids)
+    targets = [uid for uid in user_ids if uid in members]
 
-        # Verify target user is in group
-        target_membership = db.get_user_membership(request.user_id)
-        if not target_membership or target_membership["group_id"] != group_id:
-            raise HTTPException(status_code=404, detail="User not in your group")
+    # IDs and timestamp generated up-front, then a single bulk insert
+    created_at = datetime.utcnow().isoformat()
 
-        # Create payment
-        payment_id = str(uuid.uuid4())
-        payment_data = {
-            "payment_id": payment_id,
+    payments = await db.create_payments_bulk([
+        {
+            **fields,
+            "payment_id": uuid.uuid4().hex,
             "group_id": group_id,
-            "user_id": request.user_id,
-            "amount": request.amount,
-            "description": request.description,
-            "payment_type": request.payment_type,
-            "status": "PENDING",
-            "due_date": request.due_date,
-            "created_by": user_id,
-            "created_at": datetime.utcnow().isoformat(),
+            "user_id": target_user_id,
+            "user_name": (
+                members[target_user_id].get("display_name")
+                or members[target_user_id]["email"]
+            ),
+            "created_by": created_by,
+            "created_at": created_at,
         }
+        for target_user_id in targets
+    ])
 
-        db.create_payment(payment_data)
-
-        # Return created payment
-        payment = db.get_payment_by_id(payment_id)
-        return _build_payment_response(payment, db)
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return ORJSONResponse(content=[
+        _payment_payload(p, members.get(p["user_id"])) for p in payments
+    ])
 
 
 @router.post("/bulk-charge", response_model=List[PaymentResponse])
+@db_endpoint
 async def create_bulk_charge(
     request: BulkChargeRequest,
     user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service),
 ):
     """
     Create charges for multiple members (admin only)
     """
-    try:
-        db = get_db_service()
-
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership["role"] != "admin":
-            raise HTTPException(status_code=403, detail="Admin access required")
-
-        group_id = membership["group_id"]
+    # Check if user is admin
+    if not membership or membership["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
 
-        if not request.user_ids:
-            raise HTTPException(status_code=400, detail="No users selected")
-
-        created_payments: List[PaymentResponse] = []
-
-        for target_user_id in request.user_ids:
-            # Verify user is in group
-            target_membership = db.get_user_membership(target_user_id)
-            if not target_membership or target_membership["group_id"] != group_id:
-                continue  # Skip users not in group
-
-            # Create payment
-            payment_id = str(uuid.uuid4())
-            payment_data = {
-                "payment_id": payment_id,
-                "group_id": group_id,
-                "user_id": target_user_id,
-                "amount": request.amount,
-                "description": request.description,
-                "payment_type": "CHARGE",
-                "status": "PENDING",
-                "due_date": request.due_date,
-                "created_by": user_id,
-                "created_at": datetime.utcnow().isoformat(),
-            }
-
-            db.create_payment(payment_data)
-
-            # Get created payment
-            payment = db.get_payment_by_id(payment_id)
-            created_payments.append(_build_payment_response(payment, db))
-
-        return created_payments
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _create_bulk_payments(
+        db, membership["group_id"], request.user_ids, user_id, {
+            "amount": request.amount,
+            "description": request.description,
+            "payment_type": "CHARGE",
+            "status": "PENDING",
+            "due_date": request.due_date.isoformat() if request.due_date else None,
+        },
+    )
 
 
 @router.post("/bulk-credit", response_model=List[PaymentResponse])
+@db_endpoint
 async def create_bulk_credit(
     request: BulkCreditRequest,
     user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service),
 ):
     """
     Create credits for multiple members (admin only)
     """
-    try:
-        db = get_db_service()
-
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership["role"] != "admin":
-            raise HTTPException(status_code=403, detail="Admin access required")
-
-        group_id = membership["group_id"]
-
-        if not request.user_ids:
-            raise HTTPException(status_code=400, detail="No users selected")
-
-        created_payments: List[PaymentResponse] = []
-
-        for target_user_id in request.user_ids:
-            # Verify user is in group
-            target_membership = db.get_user_membership(target_user_id)
-            if not target_membership or target_membership["group_id"] != group_id:
-                continue  # Skip users not in group
+    # Check if user is admin
+    if not membership or membership["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
 
-            # Create payment
-            payment_id = str(uuid.uuid4())
-            payment_data = {
-                "payment_id": payment_id,
-                "group_id": group_id,
-                "user_id": target_user_id,
-                "amount": request.amount,
-                "description": request.description,
-                "payment_type": "CREDIT",
-                "status": "PAID",  # Credits are automatically marked as paid
-                "due_date": None,
-                "paid_date": datetime.utcnow().date().isoformat(),
-                "created_by": user_id,
-                "created_at": datetime.utcnow().isoformat(),
-            }
-
-            db.create_payment(payment_data)
-
-            # Get created payment
-            payment = db.get_payment_by_id(payment_id)
-            created_payments.append(_build_payment_response(payment, db))
-
-        return created_payments
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return await _create_bulk_payments(
+        db, membership["group_id"], request.user_ids, user_id, {
+            "amount": request.amount,
+            "description": request.description,
+            "payment_type": "CREDIT",
+            "status": "PAID",  # Credits are automatically marked as paid
+            "due_date": None,
+            "paid_date": datetime.utcnow().date().isoformat(),
+        },
+    )
 
 
 @router.put("/{payment_id}/status", response_model=PaymentResponse)
+@db_endpoint
 async def update_payment_status(
     payment_id: str,
     request: UpdatePaymentStatusRequest,
     user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service),
 ):
     """
     Update payment status
     - Admin can update any payment
     - Member can mark their own charges as PAID
     """
-    try:
-        db = get_db_service()
-
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-
-        group_id = membership["group_id"]
-        is_admin = membership["role"] == "admin"
-
-        # Get payment
-        payment = db.get_payment_by_id(payment_id)
-        if not payment:
-            raise HTTPException(status_code=404, detail="Payment not found")
-
-        # Verify payment belongs to user's group
-        if payment["group_id"] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-
-        # Check permissions
-        is_own_payment = payment["user_id"] == user_id
-        is_marking_paid = request.status == "PAID"
-
-        if not is_admin and not (is_own_payment and is_marking_paid):
-            raise HTTPException(status_code=403, detail="Permission denied")
-
-        # Validate status
-        valid_statuses = ["PENDING", "PAID", "OVERDUE"]
-        if request.status not in valid_statuses:
-            raise HTTPException(status_code=400, detail="Invalid status")
-
-        # Get old status to determine balance adjustment
-        old_status = payment["status"]
-        new_status = request.status
-        payment_type = payment["payment_type"]
-        amount = float(payment["amount"])
-        payment_user_id = payment["user_id"]
-
-        # Update status
-        update_data = {"status": request.status}
-        if request.status == "PAID":
-            update_data["paid_date"] = datetime.utcnow().date().isoformat()
-        elif request.status == "PENDING" and payment.get("paid_date"):
-            update_data["paid_date"] = None
-
-        db.update_payment(payment_id, update_data)
-
-        # Adjust balance if status changed for CHARGE payments
-        # CHARGE payments affect balance when status changes between PENDING and PAID
-        if payment_type == "CHARGE" and old_status != new_status:
-            if old_status == "PENDING" and new_status == "PAID":
-                # Payment was pending (already in balance), now paid (remove from balance)
-                db.update_member_balance(payment_user_id, group_id, -amount)
-            elif old_status == "PAID" and new_status == "PENDING":
-                # Payment was paid (not in balance), now pending (add back to balance)
-                db.update_member_balance(payment_user_id, group_id, amount)
-
-        # Return updated payment
-        payment = db.get_payment_by_id(payment_id)
-        return _build_payment_response(payment, db)
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+
+    group_id = membership["group_id"]
+    is_admin = membership["role"] == "admin"
+
+    # Members can only mark their own charges as PAID
+    if not is_admin and request.status != "PAID":
+        raise HTTPException(status_code=403, detail="Permission denied")
+
+    # One write: scoped to the group (and to the caller's own payments
+    # for non-admins), it adjusts the balance and returns the updated
+    # row with the payer's name, or {} if nothing matched ("not yours")
+    payment = await db.update_payment_status(
+        payment_id,
+        group_id,
+        request.status,
+        owner_id=None if is_admin else user_id,
+    )
+    if not payment:
+        raise HTTPException(status_code=404, detail="Payment not found")
+
+    return ORJSONResponse(content=_joined_payload(payment))
 
 
 @router.delete("/{payment_id}")
-async def delete_payment(payment_id: str, user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def delete_payment(
+    payment_id: str,
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_async_db_service)
+):
     """
     Delete payment (admin only)
     """
-    try:
-        db = get_db_service()
-
-        # Check if user is admin
-        membership = db.get_user_membership(user_id)
-        if not membership or membership["role"] != "admin":
-            raise HTTPException(status_code=403, detail="Admin access required")
-
-        group_id = membership["group_id"]
-
-        # Get payment
-        payment = db.get_payment_by_id(payment_id)
-        if not payment:
-            raise HTTPException(status_code=404, detail="Payment not found")
-
-        # Verify payment belongs to user's group
-        if payment["group_id"] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
+    # Check if user is admin
+    if not membership or membership["role"] != "admin":
+        raise HTTPException(status_code=403, detail="Admin access required")
 
-        # Delete payment
-        db.delete_payment(payment_id)
+    group_id = membership["group_id"]
 
-        return {"ok": True, "message": "Payment deleted successfully"}
+    # Delete only within the caller's group
+    if not await db.delete_payment(payment_id, group_id=group_id):
+        raise HTTPException(status_code=404, detail="Payment not found")
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return {"ok": True, "message": "Payment deleted successfully"}
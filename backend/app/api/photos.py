@@ -1,17 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File
-from pydantic import BaseModel
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Request, UploadFile, File
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from datetime import datetime
+import asyncio
+import logging
 import uuid
 
 from app.services.db_service import get_db_service
 from app.services.s3_service import upload_photo, delete_photo, get_photo_url
-from app.api.auth import get_current_user_id
+from app.services.thumbnails import generate_and_store_thumbnail, thumbnails_enabled
+from app.api.auth import get_current_user_id, get_caller_membership
+from app.utils.helpers import db_endpoint
+from app.utils.http_cache import group_view_cache
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Request/Response Models
 class PhotoResponse(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     photo_id: str
     group_id: int
     url: str
@@ -26,258 +35,245 @@ class UpdatePhotoRequest(BaseModel):
 
 
 @router.get("/", response_model=List[PhotoResponse])
+@db_endpoint
 async def get_photos(
+    http_request: Request,
     limit: int = 50,
     offset: int = 0,
-    user_id: str = Depends(get_current_user_id)
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service)
 ):
     """
     Get photos for user's group
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        
-        # Get photos
-        photos = db.get_group_photos(group_id, limit=limit, offset=offset)
-        
-        # Add uploader names
-        photo_list = []
-        for photo in photos:
-            uploader = db.get_user_by_id(photo['uploaded_by'])
-            photo_list.append(PhotoResponse(
-                **photo,
-                uploader_name=uploader.get('display_name', uploader['email']) if uploader else 'Unknown'
-            ))
-        
-        return photo_list
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    
+    version = db.get_group_version(group_id)
+    etag = group_view_cache.etag("photos", group_id, version, limit, offset)
+    cached = group_view_cache.lookup(http_request, etag)
+    if cached is not None:
+        return cached
+    
+    # Get photos
+    photos = db.get_group_photos(group_id, limit=limit, offset=offset)
+    
+    # Photo rows already carry exactly the PhotoResponse fields, so just
+    # add uploader names (one batched user lookup for the whole page)
+    # and encode the rows as-is (no model per photo)
+    uploaders = db.get_users_by_ids([photo['uploaded_by'] for photo in photos])
+    for photo in photos:
+        uploader = uploaders.get(photo['uploaded_by'])
+        photo['uploader_name'] = (uploader.get('display_name') or uploader['email']) if uploader else 'Unknown'
+    
+    return group_view_cache.store(etag, photos)
 
 
 @router.get("/{photo_id}", response_model=PhotoResponse)
-async def get_photo(photo_id: str, user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_photo(
+    photo_id: str,
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service)
+):
     """
     Get specific photo details
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        
-        # Get photo
-        photo = db.get_photo_by_id(photo_id)
-        if not photo:
-            raise HTTPException(status_code=404, detail="Photo not found")
-        
-        # Verify photo belongs to user's group
-        if photo['group_id'] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Add uploader name
-        uploader = db.get_user_by_id(photo['uploaded_by'])
-        
-        return PhotoResponse(
-            **photo,
-            uploader_name=uploader.get('display_name', uploader['email']) if uploader else 'Unknown'
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    
+    # Get photo
+    photo = db.get_photo_by_id(photo_id)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    # Verify photo belongs to user's group
+    if photo['group_id'] != group_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Add uploader name
+    uploader = db.get_user_by_id(photo['uploaded_by'])
+    
+    return PhotoResponse.model_validate({
+        **photo,
+        'uploader_name': (uploader.get('display_name') or uploader['email']) if uploader else 'Unknown'
+    })
 
 
 @router.post("/upload", response_model=PhotoResponse)
+@db_endpoint
 async def upload_photo_endpoint(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     caption: Optional[str] = None,
-    user_id: str = Depends(get_current_user_id)
+    user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service)
 ):
     """
     Upload a new photo
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        
-        # Validate file type
-        if not file.content_type.startswith('image/'):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Generate photo ID
-        photo_id = str(uuid.uuid4())
-        
-        # Upload to S3 (or local storage in development)
-        try:
-            photo_url = upload_photo(file, group_id, photo_id)
-            # TODO: Generate thumbnail
-            thumbnail_url = None
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Failed to upload photo: {str(e)}")
-        
-        # Save to database
-        photo_data = {
-            'photo_id': photo_id,
-            'group_id': group_id,
-            'url': photo_url,
-            'thumbnail_url': thumbnail_url,
-            'caption': caption,
-            'uploaded_by': user_id,
-            'uploaded_at': datetime.utcnow().isoformat()
-        }
-        
-        db.create_photo(photo_data)
-        
-        # Return created photo
-        photo = db.get_photo_by_id(photo_id)
-        uploader = db.get_user_by_id(user_id)
-        
-        return PhotoResponse(
-            **photo,
-            uploader_name=uploader.get('display_name', uploader['email']) if uploader else 'Unknown'
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    
+    # Validate file type
+    if not file.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    
+    # Generate photo ID
+    photo_id = str(uuid.uuid4())
+    
+    # Upload to S3 (or local storage in development). Blocking storage
+    # I/O (the body is streamed from the spooled upload via
+    # upload_fileobj), so keep it off the event loop, and overlap it with
+    # the uploader lookup, which doesn't depend on it
+    photo_url, uploader = await asyncio.gather(
+        run_in_threadpool(upload_photo, file, group_id, photo_id),
+        run_in_threadpool(db.get_user_by_id, user_id),
+        return_exceptions=True,
+    )
+    if isinstance(photo_url, Exception):
+        logger.error("Photo upload failed", exc_info=photo_url)
+        raise HTTPException(status_code=500, detail="Failed to upload photo")
+    if isinstance(uploader, Exception):
+        raise uploader
+    # Filled in by the background thumbnail task
+    thumbnail_url = None
+    
+    # Save to database
+    photo_data = {
+        'photo_id': photo_id,
+        'group_id': group_id,
+        'url': photo_url,
+        'thumbnail_url': thumbnail_url,
+        'caption': caption,
+        'uploaded_by': user_id,
+        'uploaded_at': datetime.utcnow().isoformat()
+    }
+    
+    # create_photo hands back the stored row, so no re-read is needed
+    photo = db.create_photo(photo_data)
+    # Resized from the stored photo after the response is sent, so the
+    # upload itself stays streamed
+    if thumbnails_enabled():
+        background_tasks.add_task(
+            generate_and_store_thumbnail, photo_url, group_id, photo_id
         )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    return PhotoResponse.model_validate({
+        **photo,
+        'uploader_name': (uploader.get('display_name') or uploader['email']) if uploader else 'Unknown'
+    })
 
 
 @router.put("/{photo_id}", response_model=PhotoResponse)
+@db_endpoint
 async def update_photo(
     photo_id: str,
     request: UpdatePhotoRequest,
-    user_id: str = Depends(get_current_user_id)
+    user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service)
 ):
     """
     Update photo caption (uploader or admin only)
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        is_admin = membership['role'] == 'admin'
-        
-        # Get photo
-        photo = db.get_photo_by_id(photo_id)
-        if not photo:
-            raise HTTPException(status_code=404, detail="Photo not found")
-        
-        # Verify photo belongs to user's group
-        if photo['group_id'] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Check permissions (admin or uploader)
-        if not is_admin and photo['uploaded_by'] != user_id:
-            raise HTTPException(status_code=403, detail="Permission denied")
-        
-        # Update photo
-        if request.caption is not None:
-            db.update_photo(photo_id, {'caption': request.caption})
-        
-        # Return updated photo
-        photo = db.get_photo_by_id(photo_id)
-        uploader = db.get_user_by_id(photo['uploaded_by'])
-        
-        return PhotoResponse(
-            **photo,
-            uploader_name=uploader.get('display_name', uploader['email']) if uploader else 'Unknown'
-        )
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    is_admin = membership['role'] == 'admin'
+    
+    # Get photo
+    photo = db.get_photo_by_id(photo_id)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    # Verify photo belongs to user's group
+    if photo['group_id'] != group_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check permissions (admin or uploader)
+    if not is_admin and photo['uploaded_by'] != user_id:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    
+    # Update photo (the write returns the updated row; with nothing to
+    # change, the row read above is already current)
+    if request.caption is not None:
+        photo = db.update_photo(photo_id, {'caption': request.caption})
+    
+    uploader = db.get_user_by_id(photo['uploaded_by'])
+    
+    return PhotoResponse.model_validate({
+        **photo,
+        'uploader_name': (uploader.get('display_name') or uploader['email']) if uploader else 'Unknown'
+    })
 
 
 @router.delete("/{photo_id}")
-async def delete_photo_endpoint(photo_id: str, user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def delete_photo_endpoint(
+    photo_id: str,
+    user_id: str = Depends(get_current_user_id),
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service)
+):
     """
     Delete photo (uploader or admin only)
     """
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    is_admin = membership['role'] == 'admin'
+    
+    # Get photo
+    photo = db.get_photo_by_id(photo_id)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
+    
+    # Verify photo belongs to user's group
+    if photo['group_id'] != group_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    
+    # Check permissions (admin or uploader)
+    if not is_admin and photo['uploaded_by'] != user_id:
+        raise HTTPException(status_code=403, detail="Permission denied")
+    
+    # Delete from S3
     try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        is_admin = membership['role'] == 'admin'
-        
-        # Get photo
-        photo = db.get_photo_by_id(photo_id)
-        if not photo:
-            raise HTTPException(status_code=404, detail="Photo not found")
-        
-        # Verify photo belongs to user's group
-        if photo['group_id'] != group_id:
-            raise HTTPException(status_code=403, detail="Access denied")
-        
-        # Check permissions (admin or uploader)
-        if not is_admin and photo['uploaded_by'] != user_id:
-            raise HTTPException(status_code=403, detail="Permission denied")
-        
-        # Delete from S3
-        try:
-            delete_photo(photo['url'])
-            if photo.get('thumbnail_url'):
-                delete_photo(photo['thumbnail_url'])
-        except Exception as e:
-            # Log error but continue with database deletion
-            print(f"Failed to delete photo from storage: {str(e)}")
-        
-        # Delete from database
-        db.delete_photo(photo_id)
-        
-        return {"ok": True, "message": "Photo deleted successfully"}
-        
-    except HTTPException:
-        raise
+        await run_in_threadpool(delete_photo, photo['url'])
+        if photo.get('thumbnail_url'):
+            await run_in_threadpool(delete_photo, photo['thumbnail_url'])
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        # Log error but continue with database deletion
+        logger.warning("Failed to delete photo %s from storage: %s", photo_id, e)
+    
+    # Delete from database
+    db.delete_photo(photo_id)
+    
+    return {"ok": True, "message": "Photo deleted successfully"}
 
 
 @router.get("/stats/count")
-async def get_photo_count(user_id: str = Depends(get_current_user_id)):
+@db_endpoint
+async def get_photo_count(
+    membership: Optional[dict] = Depends(get_caller_membership),
+    db=Depends(get_db_service),
+):
     """
     Get total photo count for user's group
     """
-    try:
-        db = get_db_service()
-        
-        membership = db.get_user_membership(user_id)
-        if not membership:
-            raise HTTPException(status_code=404, detail="User not in any group")
-        
-        group_id = membership['group_id']
-        count = db.get_group_photo_count(group_id)
-        
-        return {"count": count}
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+    if not membership:
+        raise HTTPException(status_code=404, detail="User not in any group")
+    
+    group_id = membership['group_id']
+    count = db.get_group_photo_count(group_id)
+    
+    return {"count": count}
\ No newline at end of file
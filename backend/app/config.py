@@ -1,7 +1,12 @@
-from pydantic_settings import BaseSettings
-from typing import Optional, List
+import re
+from functools import cached_property, lru_cache
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import FrozenSet, List, Optional
 
 class Settings(BaseSettings):
+    # Immutable (and hashable) once loaded; get_settings() builds it once
+    model_config = SettingsConfigDict(env_file=".env", case_sensitive=True, frozen=True)
+
     # App
     APP_NAME: str = "ClubApp API"
     APP_VERSION: str = "1.0.0"
@@ -50,15 +55,42 @@ class Settings(BaseSettings):
     # CORS
     CORS_ORIGINS: str = "http://localhost:5173,http://localhost:3000"
     
-    @property
-    def cors_origins_list(self) -> List[str]:
-        return [origin.strip() for origin in self.CORS_ORIGINS.split(",")]
+    @cached_property
+    def cors_origins(self) -> FrozenSet[str]:
+        # Parsed once; CORSMiddleware only does membership tests on it.
+        # A bare "*" entry allows every origin, as CORSMiddleware treats it.
+        entries = self._cors_origin_entries()
+        if "*" in entries:
+            return frozenset({"*"})
+        return frozenset(origin for origin in entries if "*" not in origin)
+
+    @cached_property
+    def cors_origin_regex(self) -> Optional[str]:
+        """
+        Wildcard entries such as https://*.example.com as one regex
+        (CORSMiddleware compiles it once); "*" matches one DNS label.
+        Unused when a bare "*" already allows every origin.
+        """
+        entries = self._cors_origin_entries()
+        if "*" in entries:
+            return None
+        patterns = [
+            re.escape(origin).replace(r"\*", r"[^.]+")
+            for origin in entries
+            if "*" in origin
+        ]
+        return "|".join(patterns) or None
+
+    def _cors_origin_entries(self) -> List[str]:
+        return [origin.strip() for origin in self.CORS_ORIGINS.split(",") if origin.strip()]
     
     # Frontend URL
     FRONTEND_URL: str = "http://localhost:5173"
-    
-    class Config:
-        env_file = ".env"
-        case_sensitive = True
 
-settings = Settings()
\ No newline at end of file
+
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
+
+
+settings = get_settings()
@@ -1,11 +1,18 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import JWTError, jwt
+import time
+import jwt  # PyJWT
+from cachetools import TTLCache
 from app.config import settings
-from app.services.db_service import DynamoDBService
+from app.services.db_service import get_db_service
+from app.utils.security import JWT_VERIFYING_KEY, token_cache_key
 
 security = HTTPBearer()
 
+# Recently verified payloads, keyed by token digest; repeat requests with
+# the same bearer token skip the signature check and JSON parse
+_payload_cache: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> dict:
@@ -13,11 +20,17 @@ async def get_current_user(
     Verify JWT token and return current user
     """
     token = credentials.credentials
+    key = token_cache_key(token)
+
+    cached = _payload_cache.get(key)
+    # Never serve a cached token past its own exp
+    if cached is not None and (cached.get("exp") is None or cached["exp"] > time.time()):
+        return cached
     
     try:
         payload = jwt.decode(
             token,
-            settings.JWT_SECRET_KEY,
+            JWT_VERIFYING_KEY,
             algorithms=[settings.JWT_ALGORITHM]
         )
         user_id: str = payload.get("sub")
@@ -27,23 +40,26 @@ async def get_current_user(
                 detail="Could not validate credentials",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        _payload_cache[key] = payload
         return payload
-    except JWTError:
+    except jwt.PyJWTError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-async def get_db() -> DynamoDBService:
+async def get_db():
     """
-    Get DynamoDB service instance
+    Get the process-wide DB service (the get_db_service singleton, so
+    boto3 clients and their connection pools are reused across requests)
     """
-    return DynamoDBService()
+    return get_db_service()
 
 async def require_admin(
     current_user: dict = Depends(get_current_user),
-    group_id: str = None
+    group_id: str = None,
+    db=Depends(get_db)
 ) -> dict:
     """
     Verify user is an admin of the specified group
@@ -54,11 +70,16 @@ async def require_admin(
             detail="Group ID required"
         )
     
-    # Get user's role in this group
-    db = DynamoDBService()
-    membership = db.get_membership(current_user["sub"], group_id)
+    # The caller's membership comes from the DB service's membership_cache
+    # (dropped on role changes and removals), so repeat admin checks skip
+    # the database
+    membership = db.get_user_membership(current_user["sub"])
     
-    if not membership or membership.get("role") != "ADMIN":
+    if (
+        not membership
+        or str(membership["group_id"]) != str(group_id)
+        or membership.get("role") != "admin"
+    ):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Admin access required"
@@ -1,8 +1,18 @@
 ﻿from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import asyncio
+import logging
+import os
 from app.config import settings
+from app.utils.query_count import QueryCountMiddleware, query_counting_enabled
+
+# INFO and up only; debug logging in request handlers is skipped at emit time
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger("clubhub")
 
 # Import API routers
 from app.api import auth, groups, members, events, payments, photos, chat
@@ -13,15 +23,28 @@ app = FastAPI(
     description="ClubApp API - Team Management Platform",
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    default_response_class=ORJSONResponse,
 )
 
-# CORS Configuration
+# Per-request DB query count (X-Query-Count header + log line) in development,
+# so N+1 regressions show up while working on an endpoint
+if query_counting_enabled():
+    app.add_middleware(QueryCountMiddleware)
+
+# CORS Configuration. Added last so it is the outermost middleware:
+# preflights are answered here and never reach the other middleware,
+# auth dependencies or the DB.
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.cors_origins_list,
+    allow_origins=settings.cors_origins,
+    allow_origin_regex=settings.cors_origin_regex,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Keyset cursor for paginated event listings
+    expose_headers=["X-Next-Cursor", "X-Query-Count"],
+    # Let browsers reuse a preflight for 2 hours (Chromium's cap)
+    max_age=7200,
 )
 
 # Mount static files for local photo storage
@@ -52,21 +75,27 @@ app.include_router(chat.router, prefix="/api/chat", tags=["Chat"])
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    print(f"🚀 {settings.APP_NAME} v{settings.APP_VERSION} starting up...")
-    if settings.USE_DYNAMODB:
-        print(f"📊 Database: DynamoDB (AWS)")
-    else:
-        print(f"📊 Database: SQLite (local)")
+    # bcrypt is CPU-bound, so size the default executor (used by
+    # asyncio.to_thread) to the number of cores
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+    )
+
+    logger.info("%s v%s starting up", settings.APP_NAME, settings.APP_VERSION)
+    logger.info(
+        "Database: %s",
+        "DynamoDB (AWS)" if settings.USE_DYNAMODB else "SQLite (local)",
+    )
     if settings.USE_LOCAL_STORAGE:
-        print(f"📸 Photo Storage: Local ({settings.LOCAL_STORAGE_PATH})")
+        logger.info("Photo storage: local (%s)", settings.LOCAL_STORAGE_PATH)
     else:
-        print(f"📸 Photo Storage: AWS S3 ({settings.S3_BUCKET_NAME})")
-    print(f"🔐 Auth: JWT (local)")
+        logger.info("Photo storage: AWS S3 (%s)", settings.S3_BUCKET_NAME)
+    logger.info("Auth: JWT (local)")
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
-    print(f"👋 {settings.APP_NAME} shutting down...")
+    logger.info("%s shutting down", settings.APP_NAME)
 
 # For local development
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from enum import Enum
 
@@ -25,6 +25,8 @@ class EventUpdate(BaseModel):
     type: Optional[EventType] = None
 
 class Event(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str
     groupId: str
     title: str
@@ -1,7 +1,21 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+import re
+from pydantic import AfterValidator, BaseModel, ConfigDict
+from typing import Annotated, Optional, List
 from enum import Enum
 
+# Syntax check only, compiled once: bulk invites can carry hundreds of
+# addresses, and delivery is what actually proves an address exists
+_EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+
+def _check_email(value: str) -> str:
+    if not _EMAIL_RE.fullmatch(value):
+        raise ValueError("value is not a valid email address")
+    return value
+
+
+InviteEmail = Annotated[str, AfterValidator(_check_email)]
+
 class GroupCreate(BaseModel):
     name: str
     sport: str
@@ -13,6 +27,8 @@ class GroupUpdate(BaseModel):
     description: Optional[str] = None
 
 class Group(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str
     name: str
     sport: str
@@ -26,6 +42,8 @@ class MemberRole(str, Enum):
     MEMBER = "MEMBER"
 
 class Membership(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     userId: str
     groupId: str
     userName: str
@@ -35,7 +53,7 @@ class Membership(BaseModel):
     balance: float = 0.0
 
 class InviteCreate(BaseModel):
-    emails: List[EmailStr]
+    emails: List[InviteEmail]
 
 class InviteAccept(BaseModel):
     inviteCode: str
\ No newline at end of file
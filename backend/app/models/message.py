@@ -1,9 +1,11 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 class MessageCreate(BaseModel):
     content: str
 
 class Message(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str
     groupId: str
     userId: str
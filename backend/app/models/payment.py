@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional, List
 from enum import Enum
 
@@ -25,6 +25,8 @@ class BulkPaymentCreate(BaseModel):
     dueDate: Optional[str] = None
 
 class Payment(BaseModel):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str
     groupId: str
     memberId: str
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, ConfigDict, EmailStr
 from typing import Optional
 from datetime import datetime
 
@@ -15,6 +15,8 @@ class UserLogin(BaseModel):
     password: str
 
 class User(UserBase):
+    model_config = ConfigDict(extra="ignore", frozen=True)
+
     id: str
     cognitoId: str
     createdAt: str
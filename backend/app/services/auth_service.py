@@ -1,10 +1,13 @@
+import logging
 import boto3
-from jose import jwt
+import jwt  # PyJWT
 from datetime import datetime, timedelta
 from typing import Dict, Any
 from app.config import settings
 import shortuuid
 
+logger = logging.getLogger(__name__)
+
 class CognitoService:
     def __init__(self):
         self.client = boto3.client(
@@ -48,7 +51,7 @@ class CognitoService:
             )
             return True
         except Exception as e:
-            print(f"Confirmation error: {e}")
+            logger.warning("Confirmation error: %s", e)
             return False
     
     def sign_in(self, email: str, password: str) -> Dict[str, Any]:
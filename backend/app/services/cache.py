@@ -0,0 +1,42 @@
+# app/services/cache.py
+
+import threading
+from typing import Any, Hashable, Optional
+
+from cachetools import TTLCache
+
+
+class SharedTTLCache:
+    """
+    Thread-safe TTL cache shared by the DB services. Route handlers call
+    the services both on the event loop and from the threadpool, and
+    cachetools caches aren't safe to mutate concurrently on their own.
+
+    Entries live in this process only; each worker/Lambda instance keeps
+    its own copy, so writes must invalidate explicitly and the TTL bounds
+    how stale another process can be.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            return self._cache.get(key)
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._cache[key] = value
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._cache.pop(key, None)
+
+
+# Membership rows keyed by user_id. Read on nearly every request, changed
+# only by role updates, removals and balance changes.
+membership_cache = SharedTTLCache(maxsize=100_000, ttl=60)
+
+# Invite codes keyed by group_id
+invite_code_cache = SharedTTLCache(maxsize=100_000, ttl=60)
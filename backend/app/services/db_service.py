@@ -1,11 +1,22 @@
-﻿import sqlite3
+﻿import logging
+import sqlite3
+import threading
 from contextlib import contextmanager
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 import uuid
 import shortuuid
+from starlette.concurrency import run_in_threadpool
 
 from app.config import settings
+from app.services.cache import membership_cache, invite_code_cache
+from app.utils.query_count import query_counting_enabled, record_sqlite_statement
+
+logger = logging.getLogger(__name__)
+
+# Rows per INSERT statement in create_payments_bulk (12 bound values each,
+# well under SQLite's host-parameter limit)
+_PAYMENT_INSERT_CHUNK = 500
 
 
 def _parse_db_url(url: str) -> str:
@@ -64,17 +75,42 @@ class LocalDBService:
     def __init__(self) -> None:
         db_url = getattr(settings, "DATABASE_URL", "sqlite:///./clubhub.db")
         self.db_path = _parse_db_url(db_url)
+        # sqlite3 connections are bound to the thread that opened them
+        self._local = threading.local()
         self._init_db()
 
     @contextmanager
     def _conn(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """
+        Yield this thread's connection, opening it on first use instead of
+        reconnecting on every call. The outermost block commits on success
+        and rolls back on error, so nested calls share one transaction.
+        """
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None:
+            # sqlite3 keeps an LRU of prepared statements per connection, and
+            # connections live as long as their thread, so repeated queries
+            # skip parse/plan. The default 128 slots get churned by the
+            # variable-length IN (...) batch queries; leave room for them.
+            conn = sqlite3.connect(self.db_path, cached_statements=512)
+            conn.row_factory = sqlite3.Row
+            if query_counting_enabled():
+                conn.set_trace_callback(record_sqlite_statement)
+            local.conn = conn
+            local.depth = 0
+
+        local.depth += 1
         try:
             yield conn
-            conn.commit()
+            if local.depth == 1:
+                conn.commit()
+        except BaseException:
+            if local.depth == 1:
+                conn.rollback()
+            raise
         finally:
-            conn.close()
+            local.depth -= 1
 
     def _init_db(self) -> None:
         with self._conn() as conn:
@@ -101,7 +137,13 @@ class LocalDBService:
                     description TEXT,
                     invite_code TEXT UNIQUE,
                     created_by TEXT NOT NULL,
-                    created_at TEXT NOT NULL
+                    created_at TEXT NOT NULL,
+                    member_count INTEGER NOT NULL DEFAULT 0,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    payments_version INTEGER NOT NULL DEFAULT 0,
+                    money_owed REAL NOT NULL DEFAULT 0,
+                    money_collected REAL NOT NULL DEFAULT 0,
+                    payment_count INTEGER NOT NULL DEFAULT 0
                 )
                 """
             )
@@ -183,6 +225,263 @@ class LocalDBService:
                 """
             )
 
+            # Indexes for the login/signup/membership lookups. users.email and
+            # groups.invite_code already get UNIQUE autoindexes; emails are
+            # matched case-insensitively, and membership is looked up by
+            # user_id alone, which the (group_id, user_id) PK can't serve.
+            c.execute(
+                "CREATE INDEX IF NOT EXISTS idx_users_email_lower ON users (LOWER(email))"
+            )
+            c.execute(
+                "CREATE INDEX IF NOT EXISTS idx_group_members_user_id ON group_members (user_id)"
+            )
+            # Event listings filter by group and date range and page in
+            # (event_date, event_time, event_id) order, so one index serves
+            # the filter, the sort and the keyset cursor
+            c.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_events_group_date
+                ON events (group_id, event_date, event_time, event_id)
+                """
+            )
+            # Payment listings filter by group and optionally by member and/or
+            # status (my payments, the admin filters); the membership-by-user
+            # lookup is already covered by idx_group_members_user_id above.
+            # (Statistics are read from counters on groups, so the wider
+            # covering index this once replaced is no longer needed.)
+            c.execute("DROP INDEX IF EXISTS idx_payments_group_user_status_type")
+            c.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_payments_group_user_status
+                ON payments (group_id, user_id, status)
+                """
+            )
+            # Partial index for the "last admin" checks, which count admins per group
+            c.execute(
+                """
+                CREATE INDEX IF NOT EXISTS idx_group_members_admins
+                ON group_members (group_id) WHERE role = 'admin'
+                """
+            )
+
+            # Migration: groups.member_count is denormalized so group pages
+            # don't COUNT(*) group_members on every hit. Older databases get
+            # the column added and backfilled once.
+            group_columns = {row["name"] for row in c.execute("PRAGMA table_info(groups)")}
+            if "member_count" not in group_columns:
+                c.execute(
+                    "ALTER TABLE groups ADD COLUMN member_count INTEGER NOT NULL DEFAULT 0"
+                )
+                c.execute(
+                    """
+                    UPDATE groups
+                    SET member_count = (
+                        SELECT COUNT(*) FROM group_members
+                        WHERE group_members.group_id = groups.group_id
+                    )
+                    """
+                )
+
+            # Keep member_count in step with group_members. The triggers
+            # recount (a PK-prefix lookup) rather than +1/-1 because
+            # INSERT OR REPLACE on an existing member doesn't fire the
+            # delete trigger, so a plain increment would drift.
+            for name, event, ref in (
+                ("trg_group_members_count_insert", "INSERT", "NEW"),
+                ("trg_group_members_count_delete", "DELETE", "OLD"),
+            ):
+                c.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS {name}
+                    AFTER {event} ON group_members
+                    BEGIN
+                        UPDATE groups
+                        SET member_count = (
+                            SELECT COUNT(*) FROM group_members
+                            WHERE group_id = {ref}.group_id
+                        )
+                        WHERE group_id = {ref}.group_id;
+                    END
+                    """
+                )
+
+            # groups.version changes whenever anything a cached group view
+            # shows (group info, members, events, photos) changes; GET handlers use
+            # it as their ETag. Bumped by triggers so no write path can
+            # forget it.
+            if "version" not in group_columns:
+                c.execute("ALTER TABLE groups ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+
+            for name, event, where in (
+                ("trg_groups_version_update", "UPDATE OF name, description, invite_code ON groups",
+                 "group_id = NEW.group_id"),
+                ("trg_group_members_version_insert", "INSERT ON group_members",
+                 "group_id = NEW.group_id"),
+                ("trg_group_members_version_update", "UPDATE OF role, status ON group_members",
+                 "group_id = NEW.group_id"),
+                ("trg_group_members_version_delete", "DELETE ON group_members",
+                 "group_id = OLD.group_id"),
+                ("trg_events_version_insert", "INSERT ON events", "group_id = NEW.group_id"),
+                ("trg_events_version_update", "UPDATE ON events", "group_id = NEW.group_id"),
+                ("trg_events_version_delete", "DELETE ON events", "group_id = OLD.group_id"),
+                ("trg_photos_version_insert", "INSERT ON photos", "group_id = NEW.group_id"),
+                ("trg_photos_version_update", "UPDATE ON photos", "group_id = NEW.group_id"),
+                ("trg_photos_version_delete", "DELETE ON photos", "group_id = OLD.group_id"),
+                ("trg_users_version_update", "UPDATE OF email, display_name, phone ON users",
+                 "group_id IN (SELECT group_id FROM group_members WHERE user_id = NEW.user_id)"),
+            ):
+                c.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS {name}
+                    AFTER {event}
+                    BEGIN
+                        UPDATE groups SET version = version + 1 WHERE {where};
+                    END
+                    """
+                )
+
+            # group_members.balance is the member's running balance
+            # (positive = owes money). Triggers on payments keep it current,
+            # so balance reads stay a PK lookup and no write path can skip
+            # it: unpaid (PENDING/OVERDUE) charges count +amount, credits
+            # -amount, PAID charges nothing.
+            contribution = (
+                "CASE WHEN {p}.payment_type = 'CHARGE' AND {p}.status <> 'PAID' THEN {p}.amount"
+                " WHEN {p}.payment_type = 'CREDIT' THEN -{p}.amount ELSE 0 END"
+            )
+            has_balance_triggers = c.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+                ("trg_payments_balance_insert",),
+            ).fetchone()
+
+            for name, event, delta, ref in (
+                ("trg_payments_balance_insert", "INSERT",
+                 contribution.format(p="NEW"), "NEW"),
+                ("trg_payments_balance_update", "UPDATE OF status, amount, payment_type",
+                 f"({contribution.format(p='NEW')}) - ({contribution.format(p='OLD')})", "NEW"),
+                ("trg_payments_balance_delete", "DELETE",
+                 f"-({contribution.format(p='OLD')})", "OLD"),
+            ):
+                c.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS {name}
+                    AFTER {event} ON payments
+                    BEGIN
+                        UPDATE group_members
+                        SET balance = balance + ({delta})
+                        WHERE group_id = {ref}.group_id AND user_id = {ref}.user_id;
+                    END
+                    """
+                )
+
+            # groups.payments_version counts payment writes separately, so
+            # they don't churn the members/events/group ETags; the payment
+            # views (balances, statistics) key on both counters
+            if "payments_version" not in group_columns:
+                c.execute("ALTER TABLE groups ADD COLUMN payments_version INTEGER NOT NULL DEFAULT 0")
+
+            for name, event, ref in (
+                ("trg_payments_version_insert", "INSERT", "NEW"),
+                ("trg_payments_version_update", "UPDATE", "NEW"),
+                ("trg_payments_version_delete", "DELETE", "OLD"),
+            ):
+                c.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS {name}
+                    AFTER {event} ON payments
+                    BEGIN
+                        UPDATE groups SET payments_version = payments_version + 1
+                        WHERE group_id = {ref}.group_id;
+                    END
+                    """
+                )
+
+            # Migration: balances kept by the old application-side
+            # bookkeeping are recomputed once from the payments table
+            if not has_balance_triggers:
+                c.execute(
+                    f"""
+                    UPDATE group_members
+                    SET balance = COALESCE((
+                        SELECT SUM({contribution.format(p="payments")})
+                        FROM payments
+                        WHERE payments.group_id = group_members.group_id
+                          AND payments.user_id = group_members.user_id
+                    ), 0)
+                    """
+                )
+
+            # groups.money_owed / money_collected / payment_count back the
+            # admin payment statistics, so reads are a PK lookup instead of
+            # an aggregate over the group's payments. Owed (sum of positive
+            # balances) is recounted from the group's members, like
+            # member_count, since INSERT OR REPLACE skips the delete
+            # trigger; collected and count move by deltas on payment writes.
+            if "payment_count" not in group_columns:
+                c.execute("ALTER TABLE groups ADD COLUMN money_owed REAL NOT NULL DEFAULT 0")
+                c.execute("ALTER TABLE groups ADD COLUMN money_collected REAL NOT NULL DEFAULT 0")
+                c.execute("ALTER TABLE groups ADD COLUMN payment_count INTEGER NOT NULL DEFAULT 0")
+                c.execute(
+                    """
+                    UPDATE groups
+                    SET money_owed = COALESCE((
+                            SELECT SUM(balance) FROM group_members
+                            WHERE group_members.group_id = groups.group_id AND balance > 0
+                        ), 0),
+                        money_collected = COALESCE((
+                            SELECT SUM(amount) FROM payments
+                            WHERE payments.group_id = groups.group_id
+                              AND payment_type = 'CHARGE' AND status = 'PAID'
+                        ), 0),
+                        payment_count = (
+                            SELECT COUNT(*) FROM payments
+                            WHERE payments.group_id = groups.group_id
+                        )
+                    """
+                )
+
+            for name, event, ref in (
+                ("trg_group_members_owed_insert", "INSERT", "NEW"),
+                ("trg_group_members_owed_update", "UPDATE OF balance", "NEW"),
+                ("trg_group_members_owed_delete", "DELETE", "OLD"),
+            ):
+                c.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS {name}
+                    AFTER {event} ON group_members
+                    BEGIN
+                        UPDATE groups
+                        SET money_owed = COALESCE((
+                            SELECT SUM(balance) FROM group_members
+                            WHERE group_id = {ref}.group_id AND balance > 0
+                        ), 0)
+                        WHERE group_id = {ref}.group_id;
+                    END
+                    """
+                )
+
+            collected = "CASE WHEN {p}.payment_type = 'CHARGE' AND {p}.status = 'PAID' THEN {p}.amount ELSE 0 END"
+            for name, event, count_delta, collected_delta, ref in (
+                ("trg_payments_stats_insert", "INSERT", "1",
+                 collected.format(p="NEW"), "NEW"),
+                ("trg_payments_stats_update", "UPDATE OF status, amount, payment_type", "0",
+                 f"({collected.format(p='NEW')}) - ({collected.format(p='OLD')})", "NEW"),
+                ("trg_payments_stats_delete", "DELETE", "-1",
+                 f"-({collected.format(p='OLD')})", "OLD"),
+            ):
+                c.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS {name}
+                    AFTER {event} ON payments
+                    BEGIN
+                        UPDATE groups
+                        SET payment_count = payment_count + {count_delta},
+                            money_collected = money_collected + ({collected_delta})
+                        WHERE group_id = {ref}.group_id;
+                    END
+                    """
+                )
+
             # Migration: Update existing messages with proper user_name
             c.execute(
                 """
@@ -209,25 +508,30 @@ class LocalDBService:
         - created_at
         """
         with self._conn() as conn:
-            conn.execute(
-                """
-                INSERT INTO users (user_id, email, display_name, phone, password_hash, created_at)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    user_data["user_id"],
-                    user_data["email"],
-                    user_data.get("display_name"),
-                    user_data.get("phone"),
-                    user_data["password_hash"],
-                    user_data["created_at"],
-                ),
-            )
+            self._insert_user(conn, user_data)
         return user_data
 
+    def _insert_user(self, conn, user_data: Dict[str, Any]) -> None:
+        conn.execute(
+            """
+            INSERT INTO users (user_id, email, display_name, phone, password_hash, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                user_data["user_id"],
+                user_data["email"],
+                user_data.get("display_name"),
+                user_data.get("phone"),
+                user_data["password_hash"],
+                user_data["created_at"],
+            ),
+        )
+
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         with self._conn() as conn:
-            cur = conn.execute("SELECT * FROM users WHERE email = ?", (email,))
+            cur = conn.execute(
+                "SELECT * FROM users WHERE LOWER(email) = LOWER(?)", (email,)
+            )
             row = cur.fetchone()
             return dict(row) if row else None
 
@@ -237,6 +541,23 @@ class LocalDBService:
             row = cur.fetchone()
             return dict(row) if row else None
 
+    def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Batch version of get_user_by_id: loads many users in one query.
+        Returns a dict keyed by user_id; unknown ids are simply absent.
+        """
+        ids = list(dict.fromkeys(user_ids))
+        if not ids:
+            return {}
+
+        placeholders = ", ".join("?" for _ in ids)
+        with self._conn() as conn:
+            cur = conn.execute(
+                f"SELECT * FROM users WHERE user_id IN ({placeholders})",
+                tuple(ids),
+            )
+            return {r["user_id"]: dict(r) for r in cur.fetchall()}
+
     def update_user(self, user_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         """
         Used by members.py to edit display_name / phone, etc.
@@ -252,12 +573,13 @@ class LocalDBService:
         values.append(user_id)
 
         with self._conn() as conn:
-            conn.execute(
-                f"UPDATE users SET {', '.join(fields)} WHERE user_id = ?",
+            cur = conn.execute(
+                f"UPDATE users SET {', '.join(fields)} WHERE user_id = ? RETURNING *",
                 tuple(values),
             )
+            row = cur.fetchone()
 
-        return self.get_user_by_id(user_id) or {}
+        return dict(row) if row else {}
 
     # ============= GROUP OPERATIONS =============
 
@@ -271,21 +593,25 @@ class LocalDBService:
         (invite_code will be generated separately)
         """
         with self._conn() as conn:
-            cur = conn.execute(
-                """
-                INSERT INTO groups (name, description, created_by, created_at)
-                VALUES (?, ?, ?, ?)
-                """,
-                (
-                    group_data["name"],
-                    group_data.get("description"),
-                    group_data["created_by"],
-                    group_data["created_at"],
-                ),
-            )
-            group_id = cur.lastrowid
+            group_id = self._insert_group(conn, group_data)
         return group_id
 
+    def _insert_group(self, conn, group_data: Dict[str, Any]) -> int:
+        cur = conn.execute(
+            """
+            INSERT INTO groups (name, description, invite_code, created_by, created_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            (
+                group_data["name"],
+                group_data.get("description"),
+                group_data.get("invite_code"),
+                group_data["created_by"],
+                group_data["created_at"],
+            ),
+        )
+        return cur.lastrowid
+
     def generate_group_invite_code(self, group_id: int, regenerate: bool = False) -> str:
         """
         Generate a new invite code for a group.
@@ -303,8 +629,29 @@ class LocalDBService:
                 "UPDATE groups SET invite_code = ? WHERE group_id = ?",
                 (invite_code, group_id),
             )
+        invite_code_cache.set(group_id, invite_code)
         return invite_code
 
+    def ensure_group_invite_code(self, group_id: int) -> Optional[str]:
+        """
+        Return the group's invite code, generating one in the same statement
+        if it has none (concurrent callers all get the same code).
+        """
+        with self._conn() as conn:
+            cur = conn.execute(
+                """
+                UPDATE groups SET invite_code = COALESCE(invite_code, ?)
+                WHERE group_id = ?
+                RETURNING invite_code
+                """,
+                (shortuuid.ShortUUID().random(length=6).upper(), group_id),
+            )
+            row = cur.fetchone()
+        if not row:
+            return None
+        invite_code_cache.set(group_id, row["invite_code"])
+        return row["invite_code"]
+
     def get_group_by_invite_code(self, invite_code: str) -> Optional[Dict[str, Any]]:
         with self._conn() as conn:
             cur = conn.execute(
@@ -319,13 +666,42 @@ class LocalDBService:
             row = cur.fetchone()
             return dict(row) if row else None
 
+    def get_group_version(self, group_id: int) -> Optional[int]:
+        """
+        Change counter for the group's cached views (group info, members,
+        events, photos). None if the group doesn't exist.
+        """
+        with self._conn() as conn:
+            cur = conn.execute("SELECT version FROM groups WHERE group_id = ?", (group_id,))
+            row = cur.fetchone()
+            return row["version"] if row else None
+
+    def get_payments_version(self, group_id: int) -> Optional[int]:
+        """
+        Change counter for the group's payment views (balances, statistics):
+        moves whenever a member or a payment changes (both counters only
+        ever increase, so their sum does too). None if the group doesn't exist.
+        """
+        with self._conn() as conn:
+            cur = conn.execute(
+                "SELECT version + payments_version AS v FROM groups WHERE group_id = ?",
+                (group_id,),
+            )
+            row = cur.fetchone()
+            return row["v"] if row else None
+
     def get_group_invite_code(self, group_id: int) -> Optional[str]:
         """
         Get the invite code for a group.
         Returns None if the group doesn't exist or doesn't have an invite code yet.
         """
+        invite_code = invite_code_cache.get(group_id)
+        if invite_code is not None:
+            return invite_code
+
         group = self.get_group_by_id(group_id)
         if group and group.get('invite_code'):
+            invite_code_cache.set(group_id, group['invite_code'])
             return group['invite_code']
         return None
 
@@ -346,6 +722,8 @@ class LocalDBService:
                 f"UPDATE groups SET {', '.join(fields)} WHERE group_id = ?",
                 tuple(values),
             )
+        if "invite_code" in updates:
+            invite_code_cache.pop(group_id)
 
         return self.get_group_by_id(group_id) or {}
 
@@ -376,28 +754,69 @@ class LocalDBService:
         - balance (float, usually 0)
         """
         with self._conn() as conn:
-            conn.execute(
-                """
-                INSERT OR REPLACE INTO group_members
-                    (group_id, user_id, role, joined_at, status, balance)
-                VALUES (?, ?, ?, ?, ?, ?)
-                """,
-                (
-                    member_data["group_id"],
-                    member_data["user_id"],
-                    member_data["role"],
-                    member_data["joined_at"],
-                    member_data.get("status", "ACTIVE"),
-                    member_data.get("balance", 0.0),
-                ),
-            )
+            self._insert_group_member(conn, member_data)
+        membership_cache.pop(member_data["user_id"])
         return member_data
 
+    def _insert_group_member(self, conn, member_data: Dict[str, Any]) -> None:
+        conn.execute(
+            """
+            INSERT OR REPLACE INTO group_members
+                (group_id, user_id, role, joined_at, status, balance)
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (
+                member_data["group_id"],
+                member_data["user_id"],
+                member_data["role"],
+                member_data["joined_at"],
+                member_data.get("status", "ACTIVE"),
+                member_data.get("balance", 0.0),
+            ),
+        )
+
+    def signup_atomic(
+        self,
+        user_data: Dict[str, Any],
+        group_data: Optional[Dict[str, Any]],
+        member_data: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        """
+        Create a user, optionally a new group (with a fresh invite code),
+        and the user's membership in a single transaction.
+
+        When group_data is given the membership joins the new group;
+        otherwise member_data must already carry group_id.
+
+        Returns {"group_id": int, "invite_code": str | None}.
+        """
+        invite_code = None
+        with self._conn() as conn:
+            self._insert_user(conn, user_data)
+
+            group_id = member_data.get("group_id")
+            if group_data is not None:
+                invite_code = shortuuid.ShortUUID().random(length=6).upper()
+                group_id = self._insert_group(
+                    conn, {**group_data, "invite_code": invite_code}
+                )
+
+            self._insert_group_member(conn, {**member_data, "group_id": group_id})
+
+        return {"group_id": group_id, "invite_code": invite_code}
+
     def get_user_membership(self, user_id: str) -> Optional[Dict[str, Any]]:
         """
         Returns the first membership for this user (for now we assume
         a user belongs to a single active group).
+
+        Served from membership_cache when possible; writes to the user's
+        membership row invalidate it, group renames age out with the TTL.
         """
+        cached = membership_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
         with self._conn() as conn:
             cur = conn.execute(
                 """
@@ -410,7 +829,11 @@ class LocalDBService:
                 (user_id,),
             )
             row = cur.fetchone()
-            return dict(row) if row else None
+        if not row:
+            return None
+        membership = dict(row)
+        membership_cache.set(user_id, membership)
+        return dict(membership)
 
     def get_group_members(self, group_id: int) -> List[Dict[str, Any]]:
         """
@@ -429,6 +852,50 @@ class LocalDBService:
             )
             return [dict(r) for r in cur.fetchall()]
 
+    def get_member_bundle(self, group_id: int, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        One member of a group: user profile plus membership fields, in a
+        single query. None if the user isn't a member of that group.
+        """
+        with self._conn() as conn:
+            cur = conn.execute(
+                """
+                SELECT u.user_id, u.email, u.display_name, u.phone,
+                       gm.group_id, gm.role, gm.joined_at, gm.status, gm.balance
+                FROM group_members gm
+                JOIN users u ON u.user_id = gm.user_id
+                WHERE gm.group_id = ? AND gm.user_id = ?
+                """,
+                (group_id, user_id),
+            )
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+    def get_member_bundles(
+        self, group_id: int, user_ids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Batch version of get_member_bundle, keyed by user_id. Users who
+        aren't members of that group are simply absent.
+        """
+        ids = list(dict.fromkeys(user_ids))
+        if not ids:
+            return {}
+
+        placeholders = ", ".join("?" for _ in ids)
+        with self._conn() as conn:
+            cur = conn.execute(
+                f"""
+                SELECT u.user_id, u.email, u.display_name, u.phone,
+                       gm.group_id, gm.role, gm.joined_at, gm.status, gm.balance
+                FROM group_members gm
+                JOIN users u ON u.user_id = gm.user_id
+                WHERE gm.group_id = ? AND gm.user_id IN ({placeholders})
+                """,
+                (group_id, *ids),
+            )
+            return {r["user_id"]: dict(r) for r in cur.fetchall()}
+
     def get_group_admin_count(self, group_id: int) -> int:
         """
         Used to prevent demoting/removing the last admin.
@@ -465,18 +932,30 @@ class LocalDBService:
         """
         Signature matches members.py:
             db.update_member_role(group_id, member_id, request.role)
+
+        Returns the updated membership row, or {} if the user isn't in the
+        group or the change would demote the group's last admin (checked
+        in the same statement, so concurrent demotions can't both pass).
         """
         with self._conn() as conn:
-            conn.execute(
+            cur = conn.execute(
                 """
                 UPDATE group_members
                 SET role = ?
                 WHERE group_id = ? AND user_id = ?
+                  AND (
+                    ? = 'admin'
+                    OR role <> 'admin'
+                    OR (SELECT COUNT(*) FROM group_members
+                        WHERE group_id = ? AND role = 'admin') > 1
+                  )
+                RETURNING *
                 """,
-                (role, group_id, user_id),
+                (role, group_id, user_id, role, group_id),
             )
-        mem = self.get_user_membership(user_id)
-        return mem or {}
+            row = cur.fetchone()
+        membership_cache.pop(user_id)
+        return dict(row) if row else {}
 
     def update_member_balance(self, user_id: str, group_id: int, amount: float) -> None:
         with self._conn() as conn:
@@ -488,6 +967,7 @@ class LocalDBService:
                 """,
                 (amount, user_id, group_id),
             )
+        membership_cache.pop(user_id)
 
     def get_user_balance(self, user_id: str, group_id: int) -> float:
         """
@@ -507,25 +987,40 @@ class LocalDBService:
                 return 0.0
             return float(row["balance"])
 
-    def remove_member(self, user_id: str, group_id: int) -> None:
+    def remove_member(self, user_id: str, group_id: int) -> bool:
+        """
+        Remove a membership. Returns False if the user isn't in the group
+        or is its last admin (checked in the same statement).
+        """
         with self._conn() as conn:
-            conn.execute(
-                "DELETE FROM group_members WHERE user_id = ? AND group_id = ?",
-                (user_id, group_id),
+            cur = conn.execute(
+                """
+                DELETE FROM group_members
+                WHERE user_id = ? AND group_id = ?
+                  AND (
+                    role <> 'admin'
+                    OR (SELECT COUNT(*) FROM group_members
+                        WHERE group_id = ? AND role = 'admin') > 1
+                  )
+                """,
+                (user_id, group_id, group_id),
             )
+            removed = cur.rowcount > 0
+        membership_cache.pop(user_id)
+        return removed
 
-    def remove_group_member(self, group_id: int, user_id: str) -> None:
+    def remove_group_member(self, group_id: int, user_id: str) -> bool:
         """
         Wrapper to match members.py:
             db.remove_group_member(group_id, member_id)
         """
-        self.remove_member(user_id, group_id)
+        return self.remove_member(user_id, group_id)
 
     # ============= EVENT OPERATIONS =============
 
-    def create_event(self, event_data: Dict[str, Any]) -> None:
+    def create_event(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Insert a new event.
+        Insert a new event and return the stored row.
 
         Expected keys in event_data (as built in api/events.py):
         - event_id
@@ -540,12 +1035,13 @@ class LocalDBService:
         - created_at
         """
         with self._conn() as conn:
-            conn.execute(
+            cur = conn.execute(
                 """
                 INSERT INTO events
                     (event_id, group_id, title, description, event_date,
                      event_time, location, event_type, created_by, created_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING *
                 """,
                 (
                     event_data["event_id"],
@@ -560,6 +1056,7 @@ class LocalDBService:
                     event_data["created_at"],
                 ),
             )
+            return dict(cur.fetchone())
 
     def get_event_by_id(self, event_id: str) -> Optional[Dict[str, Any]]:
         with self._conn() as conn:
@@ -578,12 +1075,14 @@ class LocalDBService:
         end_date: Optional[str] = None,
         event_type: Optional[str] = None,
         limit: Optional[int] = None,
+        after: Optional[Tuple[str, str, str]] = None,
     ) -> List[Dict[str, Any]]:
         """
         Return events for a group, optionally filtered by date range, type, and limit.
 
         Dates are stored as 'YYYY-MM-DD' text, so string comparisons work for
-        >= / <= and ordering.
+        >= / <= and ordering. after is a keyset cursor, the
+        (event_date, event_time, event_id) of the last event already seen.
         """
         query = """
             SELECT * FROM events
@@ -603,7 +1102,11 @@ class LocalDBService:
             query += " AND event_type = ?"
             params.append(event_type)
 
-        query += " ORDER BY event_date, event_time"
+        if after:
+            query += " AND (event_date, event_time, event_id) > (?, ?, ?)"
+            params.extend(after)
+
+        query += " ORDER BY event_date, event_time, event_id"
 
         if limit is not None:
             query += " LIMIT ?"
@@ -613,31 +1116,57 @@ class LocalDBService:
             cur = conn.execute(query, tuple(params))
             return [dict(r) for r in cur.fetchall()]
 
-    def update_event(self, event_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
+    def update_event(
+        self, event_id: str, updates: Dict[str, Any], group_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Update an event and return the updated row. With group_id, only an
+        event in that group is touched; {} means nothing matched.
+        """
         if not updates:
-            return self.get_event_by_id(event_id) or {}
+            event = self.get_event_by_id(event_id) or {}
+            if group_id is not None and event.get("group_id") != group_id:
+                return {}
+            return event
         fields = []
         values: List[Any] = []
         for k, v in updates.items():
             fields.append(f"{k} = ?")
             values.append(v)
+        where = "event_id = ?"
         values.append(event_id)
+        if group_id is not None:
+            where += " AND group_id = ?"
+            values.append(group_id)
         with self._conn() as conn:
-            conn.execute(
-                f"UPDATE events SET {', '.join(fields)} WHERE event_id = ?",
+            cur = conn.execute(
+                f"UPDATE events SET {', '.join(fields)} WHERE {where} RETURNING *",
                 tuple(values),
             )
-        return self.get_event_by_id(event_id) or {}
+            row = cur.fetchone()
+        return dict(row) if row else {}
 
-    def delete_event(self, event_id: str) -> None:
+    def delete_event(self, event_id: str, group_id: Optional[int] = None) -> bool:
+        """
+        Delete an event (only within group_id, if given).
+        Returns False if nothing was deleted.
+        """
         with self._conn() as conn:
-            conn.execute("DELETE FROM events WHERE event_id = ?", (event_id,))
+            if group_id is None:
+                cur = conn.execute("DELETE FROM events WHERE event_id = ?", (event_id,))
+            else:
+                cur = conn.execute(
+                    "DELETE FROM events WHERE event_id = ? AND group_id = ?",
+                    (event_id, group_id),
+                )
+            return cur.rowcount > 0
 
     # ============= PAYMENT OPERATIONS =============
 
-    def create_payment(self, payment_data: dict) -> None:
+    def create_payment(self, payment_data: dict) -> Dict[str, Any]:
         """
-        Insert a new payment row and update the member's running balance.
+        Insert a new payment row (the payments triggers update the member's
+        running balance). Returns the stored row.
 
         Expected keys in payment_data:
             payment_id, group_id, user_id, amount, description,
@@ -645,7 +1174,7 @@ class LocalDBService:
             status,                 # usually 'PENDING' on create
             due_date (or None),
             created_by, created_at  # ISO strings
-            optional: paid_date
+            optional: paid_date, user_name (looked up if missing)
         """
         payment_id = payment_data["payment_id"]
         group_id = payment_data["group_id"]
@@ -660,12 +1189,14 @@ class LocalDBService:
         created_at = payment_data["created_at"]
 
         # Get user's name for the payment record
-        user = self.get_user_by_id(user_id)
-        user_name = user.get("display_name", user["email"]) if user else "Unknown"
+        user_name = payment_data.get("user_name")
+        if not user_name:
+            user = self.get_user_by_id(user_id)
+            user_name = (user.get("display_name") or user["email"]) if user else "Unknown"
 
         # INSERT that matches your payments table (includes user_name)
         with self._conn() as conn:
-            conn.execute(
+            cur = conn.execute(
                 """
                 INSERT INTO payments (
                     payment_id,
@@ -682,6 +1213,7 @@ class LocalDBService:
                     created_at
                 )
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                RETURNING *
                 """,
                 (
                     payment_id,
@@ -698,16 +1230,71 @@ class LocalDBService:
                     created_at,
                 ),
             )
+            row = dict(cur.fetchone())
+
+        # The payments triggers adjusted the member's balance
+        membership_cache.pop(user_id)
+        return row
+
+    def create_payments_bulk(self, payments: List[dict]) -> List[Dict[str, Any]]:
+        """
+        Batch version of create_payment: all rows go in with multi-row
+        INSERT ... RETURNING statements in one transaction. Takes the same keys as create_payment plus
+        an optional user_name (looked up if missing). Returns the stored
+        rows in input order.
+        """
+        if not payments:
+            return []
+
+        missing = [p["user_id"] for p in payments if not p.get("user_name")]
+        users = self.get_users_by_ids(missing) if missing else {}
+
+        rows = []
+        for p in payments:
+            user_name = p.get("user_name")
+            if not user_name:
+                user = users.get(p["user_id"])
+                user_name = (user.get("display_name") or user["email"]) if user else "Unknown"
+            rows.append((
+                p["payment_id"],
+                p["group_id"],
+                p["user_id"],
+                user_name,
+                float(p["amount"]),
+                p["description"],
+                p["payment_type"],
+                p["status"],
+                p.get("due_date"),
+                p.get("paid_date"),
+                p["created_by"],
+                p["created_at"],
+            ))
+
+        stored: Dict[str, Dict[str, Any]] = {}
+        with self._conn() as conn:
+            for i in range(0, len(rows), _PAYMENT_INSERT_CHUNK):
+                chunk = rows[i:i + _PAYMENT_INSERT_CHUNK]
+                values = ", ".join("(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)" for _ in chunk)
+                cur = conn.execute(
+                    f"""
+                    INSERT INTO payments (
+                        payment_id, group_id, user_id, user_name, amount,
+                        description, payment_type, status, due_date,
+                        paid_date, created_by, created_at
+                    )
+                    VALUES {values}
+                    RETURNING *
+                    """,
+                    tuple(v for row in chunk for v in row),
+                )
+                stored.update((r["payment_id"], dict(r)) for r in cur.fetchall())
 
-        # Adjust member balance based on payment_type
-        # Positive balance = member owes money
-        # Negative balance = member has credit
-        # CHARGE  -> member owes more  -> balance goes UP (add amount)
-        # CREDIT  -> member owes less  -> balance goes DOWN (subtract amount)
-        if payment_type == "CHARGE":
-            self.update_member_balance(user_id, group_id, amount)
-        elif payment_type == "CREDIT":
-            self.update_member_balance(user_id, group_id, -amount)
+        # The payments triggers adjusted the members' balances
+        for uid in {p["user_id"] for p in payments}:
+            membership_cache.pop(uid)
+
+        # RETURNING order isn't guaranteed; hand rows back in input order
+        return [stored[p["payment_id"]] for p in payments]
 
     def get_payment(self, payment_id: str) -> Optional[Dict[str, Any]]:
         with self._conn() as conn:
@@ -723,6 +1310,29 @@ class LocalDBService:
         """
         return self.get_payment(payment_id)
 
+    def get_payment_scoped(
+        self, payment_id: str, group_id: int, user_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        A payment plus the payer's email and display_name, in one query,
+        only if it belongs to group_id (and to user_id, when given). None
+        means missing or not visible to the caller.
+        """
+        query = """
+            SELECT p.*, u.email, u.display_name
+            FROM payments p
+            LEFT JOIN users u ON u.user_id = p.user_id
+            WHERE p.payment_id = ? AND p.group_id = ?
+        """
+        params: List[Any] = [payment_id, group_id]
+        if user_id is not None:
+            query += " AND p.user_id = ?"
+            params.append(user_id)
+
+        with self._conn() as conn:
+            row = conn.execute(query, tuple(params)).fetchone()
+            return dict(row) if row else None
+
     def get_group_payments(
         self,
         group_id: int,
@@ -755,6 +1365,33 @@ class LocalDBService:
             cur = conn.execute(query, tuple(params))
             return [dict(r) for r in cur.fetchall()]
 
+    def get_payment_statistics(self, group_id: int) -> Dict[str, Any]:
+        """
+        Group payment totals: money owed (sum of positive member balances),
+        money collected (paid charges) and the payment count. Read from the
+        trigger-maintained counters on groups. Keys match
+        PaymentStatisticsResponse.
+        """
+        with self._conn() as conn:
+            cur = conn.execute(
+                """
+                SELECT money_owed AS total_money_owed,
+                       money_collected AS total_money_collected,
+                       payment_count AS total_payments_count
+                FROM groups
+                WHERE group_id = ?
+                """,
+                (group_id,),
+            )
+            row = cur.fetchone()
+            if not row:
+                return {
+                    "total_money_owed": 0.0,
+                    "total_money_collected": 0.0,
+                    "total_payments_count": 0,
+                }
+            return dict(row)
+
     def get_user_payments(self, user_id: str) -> List[Dict[str, Any]]:
         with self._conn() as conn:
             cur = conn.execute(
@@ -782,35 +1419,73 @@ class LocalDBService:
 
         return self.get_payment(payment_id) or {}
 
-    def delete_payment(self, payment_id: str) -> None:
+    def update_payment_status(
+        self,
+        payment_id: str,
+        group_id: int,
+        status: str,
+        owner_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """
-        Delete a payment and reverse its balance adjustment.
+        Set a payment's status in one statement: paid_date is stamped on
+        PAID and cleared on PENDING, and the payments triggers move a CHARGE
+        out of / back into the member's balance.
 
-        When deleting a payment, we reverse the balance change:
-        - CHARGE payments increased balance, so we decrease it back
-        - CREDIT payments decreased balance, so we increase it back
+        Scoped to group_id, and to owner_id's own payments when given.
+        Returns the updated row plus the payer's email and display_name, or
+        {} if nothing matched.
         """
-        # First get the payment details so we can reverse the balance
-        payment = self.get_payment(payment_id)
-        if not payment:
-            return
+        scope = "payment_id = ? AND group_id = ?"
+        params: List[Any] = [payment_id, group_id]
+        if owner_id is not None:
+            scope += " AND user_id = ?"
+            params.append(owner_id)
 
-        user_id = payment["user_id"]
-        group_id = payment["group_id"]
-        amount = float(payment["amount"])
-        payment_type = payment["payment_type"]
+        today = datetime.utcnow().date().isoformat()
+        with self._conn() as conn:
+            row = conn.execute(
+                f"""
+                UPDATE payments
+                SET status = ?,
+                    paid_date = CASE ?
+                        WHEN 'PAID' THEN ?
+                        WHEN 'PENDING' THEN NULL
+                        ELSE paid_date
+                    END
+                WHERE {scope}
+                RETURNING *,
+                    (SELECT email FROM users
+                     WHERE users.user_id = payments.user_id) AS email,
+                    (SELECT display_name FROM users
+                     WHERE users.user_id = payments.user_id) AS display_name
+                """,
+                (status, status, today, *params),
+            ).fetchone()
+
+        if not row:
+            return {}
+        membership_cache.pop(row["user_id"])
+        return dict(row)
+
+    def delete_payment(self, payment_id: str, group_id: Optional[int] = None) -> bool:
+        """
+        Delete a payment (only within group_id, when given); the payments
+        triggers take whatever it contributed back out of the member's
+        balance. Returns False if nothing was deleted.
+        """
+        query = "DELETE FROM payments WHERE payment_id = ?"
+        params: List[Any] = [payment_id]
+        if group_id is not None:
+            query += " AND group_id = ?"
+            params.append(group_id)
 
-        # Delete the payment
         with self._conn() as conn:
-            conn.execute("DELETE FROM payments WHERE payment_id = ?", (payment_id,))
+            row = conn.execute(query + " RETURNING user_id", tuple(params)).fetchone()
 
-        # Reverse the balance adjustment
-        if payment_type == "CHARGE":
-            # CHARGE increased balance, so subtract it back
-            self.update_member_balance(user_id, group_id, -amount)
-        elif payment_type == "CREDIT":
-            # CREDIT decreased balance, so add it back
-            self.update_member_balance(user_id, group_id, amount)
+        if not row:
+            return False
+        membership_cache.pop(row["user_id"])
+        return True
 
     # ============= MESSAGE OPERATIONS =============
 
@@ -830,8 +1505,10 @@ class LocalDBService:
             created_at = message_data.get('created_at', datetime.utcnow().isoformat())
 
             # Get user_name from database if not in message_data
-            user = self.get_user_by_id(user_id)
-            user_name = user.get('display_name', user['email']) if user else 'Unknown'
+            user_name = message_data.get('user_name')
+            if not user_name:
+                user = self.get_user_by_id(user_id)
+                user_name = (user.get('display_name') or user['email']) if user else 'Unknown'
         else:
             # Individual parameters format (legacy)
             message_id = str(uuid.uuid4())
@@ -848,7 +1525,15 @@ class LocalDBService:
                 (message_id, group_id, user_id, user_name, content, created_at),
             )
 
-        return self.get_message(message_id)
+        # Everything in the row is known here; no need to read it back
+        return {
+            "message_id": message_id,
+            "group_id": group_id,
+            "user_id": user_id,
+            "user_name": user_name,
+            "content": content,
+            "created_at": created_at,
+        }
 
     def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
         with self._conn() as conn:
@@ -914,11 +1599,12 @@ class LocalDBService:
         - uploaded_at (str, ISO timestamp)
         """
         with self._conn() as conn:
-            conn.execute(
+            cur = conn.execute(
                 """
                 INSERT INTO photos
                     (photo_id, group_id, url, thumbnail_url, caption, uploaded_by, uploaded_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
+                RETURNING *
                 """,
                 (
                     photo_data["photo_id"],
@@ -930,7 +1616,7 @@ class LocalDBService:
                     photo_data["uploaded_at"],
                 ),
             )
-        return self.get_photo_by_id(photo_data["photo_id"])
+            return dict(cur.fetchone())
 
     def get_photo_by_id(self, photo_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -1001,12 +1687,12 @@ class LocalDBService:
         values.append(photo_id)
 
         with self._conn() as conn:
-            conn.execute(
-                f"UPDATE photos SET {', '.join(fields)} WHERE photo_id = ?",
+            cur = conn.execute(
+                f"UPDATE photos SET {', '.join(fields)} WHERE photo_id = ? RETURNING *",
                 tuple(values),
             )
-
-        return self.get_photo_by_id(photo_id) or {}
+            row = cur.fetchone()
+            return dict(row) if row else {}
 
     def delete_photo(self, photo_id: str) -> None:
         """
@@ -1052,8 +1738,47 @@ def get_db_service():
         if use_dynamodb:
             from app.services.dynamodb_service import DynamoDBService
             _db_service = DynamoDBService()
-            print("🗄️  Using DynamoDB for persistent storage")
+            logger.info("Using DynamoDB for persistent storage")
         else:
             _db_service = LocalDBService()
-            print("🗄️  Using SQLite for local storage")
+            logger.info("Using SQLite for local storage")
     return _db_service
+
+
+class AsyncDBService:
+    """
+    Awaitable view of a DB service: each method runs in the worker thread
+    pool, so blocking SQLite/boto3 calls don't stall the event loop.
+
+        db = get_async_db_service()
+        membership = await db.get_user_membership(user_id)
+    """
+
+    def __init__(self, db) -> None:
+        self._db = db
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._db, name)
+        if not callable(attr):
+            return attr
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(attr, *args, **kwargs)
+
+        call.__name__ = name
+        # Cache the wrapper so later lookups skip __getattr__
+        setattr(self, name, call)
+        return call
+
+
+_async_db_service: Optional[AsyncDBService] = None
+
+
+def get_async_db_service() -> AsyncDBService:
+    """
+    Get the awaitable wrapper around get_db_service() (singleton).
+    """
+    global _async_db_service
+    if _async_db_service is None:
+        _async_db_service = AsyncDBService(get_db_service())
+    return _async_db_service
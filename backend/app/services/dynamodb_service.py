@@ -1,13 +1,16 @@
 import os
 import boto3
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
 from decimal import Decimal
 import uuid
 import shortuuid
 from boto3.dynamodb.conditions import Key, Attr
+from botocore.config import Config
 
 from app.config import settings
+from app.services.cache import membership_cache, invite_code_cache
+from app.utils.query_count import query_counting_enabled, record_query
 
 
 def decimal_to_float(obj):
@@ -40,6 +43,30 @@ def float_to_decimal(obj):
     return obj
 
 
+# DB calls run in starlette's threadpool (up to 40 at once), so the shared
+# client needs more than botocore's default 10 pooled connections or those
+# threads queue for a socket. Keep-alive and adaptive retries (which back
+# off client-side on throttling) suit the long-lived process-wide client.
+_BOTO_CONFIG = Config(
+    max_pool_connections=50,
+    tcp_keepalive=True,
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+)
+
+
+def _balance_contribution(payment: Dict[str, Any]) -> float:
+    """
+    What a payment adds to its member's balance (positive = owes money):
+    unpaid (PENDING/OVERDUE) charges +amount, credits -amount, PAID
+    charges nothing. Same rule as the SQLite payments triggers.
+    """
+    if payment['payment_type'] == 'CHARGE' and payment['status'] != 'PAID':
+        return payment['amount']
+    if payment['payment_type'] == 'CREDIT':
+        return -payment['amount']
+    return 0
+
+
 class DynamoDBService:
     """
     DynamoDB-backed service for ClubHub application.
@@ -48,7 +75,11 @@ class DynamoDBService:
 
     def __init__(self) -> None:
         # Initialize DynamoDB client
-        self.dynamodb = boto3.resource('dynamodb')
+        self.dynamodb = boto3.resource('dynamodb', config=_BOTO_CONFIG)
+        if query_counting_enabled():
+            self.dynamodb.meta.client.meta.events.register(
+                'before-send.dynamodb.*', record_query
+            )
 
         # Get table names from environment variables
         self.users_table = self.dynamodb.Table(os.environ.get('DYNAMODB_USERS_TABLE', 'ClubHub-Users'))
@@ -63,11 +94,16 @@ class DynamoDBService:
 
     def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new user"""
+        item = self._user_item(user_data)
+        self.users_table.put_item(Item=item)
+        return item
+
+    def _user_item(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         # Use the user_id from user_data if provided, otherwise generate one
         user_id = user_data.get('user_id', str(uuid.uuid4()))
         created_at = user_data.get('created_at', datetime.utcnow().isoformat())
 
-        item = {
+        return {
             'user_id': user_id,
             'email': user_data['email'],
             'display_name': user_data.get('display_name', ''),
@@ -76,9 +112,6 @@ class DynamoDBService:
             'created_at': created_at
         }
 
-        self.users_table.put_item(Item=item)
-        return item
-
     def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email using GSI"""
         response = self.users_table.query(
@@ -94,6 +127,24 @@ class DynamoDBService:
         item = response.get('Item')
         return decimal_to_float(item) if item else None
 
+    def get_users_by_ids(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get many users by ID using BatchGetItem (100 keys per request)"""
+        ids = list(dict.fromkeys(user_ids))
+        table_name = self.users_table.name
+        users: Dict[str, Dict[str, Any]] = {}
+
+        for i in range(0, len(ids), 100):
+            request_items = {table_name: {'Keys': [{'user_id': uid} for uid in ids[i:i + 100]]}}
+            while request_items:
+                response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                for item in response.get('Responses', {}).get(table_name, []):
+                    user = decimal_to_float(item)
+                    users[user['user_id']] = user
+                # Retry anything DynamoDB throttled out of this batch
+                request_items = response.get('UnprocessedKeys')
+
+        return users
+
     def update_user(self, user_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
         """Update user information"""
         update_expr_parts = []
@@ -116,12 +167,21 @@ class DynamoDBService:
             ExpressionAttributeValues=expr_attr_values,
             ReturnValues='ALL_NEW'
         )
+        # Profile fields show up in the group's member list
+        membership = self.get_user_membership(user_id)
+        if membership:
+            self._bump_group_version(membership['group_id'])
         return decimal_to_float(response['Attributes'])
 
     # ==================== GROUP METHODS ====================
 
     def create_group(self, group_data: Dict[str, Any]) -> int:
         """Create a new group and return its ID"""
+        item = self._group_item(group_data)
+        self.groups_table.put_item(Item=item)
+        return item['group_id']
+
+    def _group_item(self, group_data: Dict[str, Any]) -> Dict[str, Any]:
         # Generate a unique group_id (using timestamp + random for uniqueness)
         group_id = int(datetime.utcnow().timestamp() * 1000)
         created_at = group_data.get('created_at', datetime.utcnow().isoformat())
@@ -131,7 +191,8 @@ class DynamoDBService:
             'name': group_data['name'],
             'description': group_data.get('description', ''),
             'created_by': group_data.get('created_by', ''),
-            'created_at': created_at
+            'created_at': created_at,
+            'member_count': group_data.get('member_count', 0)
         }
 
         # Only include invite_code if it's provided and non-empty
@@ -139,8 +200,7 @@ class DynamoDBService:
         if group_data.get('invite_code'):
             item['invite_code'] = group_data['invite_code']
 
-        self.groups_table.put_item(Item=item)
-        return group_id
+        return item
 
     def generate_group_invite_code(self, group_id: int, regenerate: bool = False) -> str:
         """
@@ -157,9 +217,33 @@ class DynamoDBService:
 
         self.groups_table.update_item(
             Key={'group_id': group_id},
-            UpdateExpression='SET invite_code = :code',
-            ExpressionAttributeValues={':code': invite_code}
+            UpdateExpression='SET invite_code = :code ADD version :one',
+            ExpressionAttributeValues={':code': invite_code, ':one': 1}
         )
+        invite_code_cache.set(group_id, invite_code)
+        return invite_code
+
+    def ensure_group_invite_code(self, group_id: int) -> Optional[str]:
+        """
+        Return the group's invite code, generating one in the same update
+        if it has none (concurrent callers all get the same code).
+        """
+        try:
+            response = self.groups_table.update_item(
+                Key={'group_id': group_id},
+                UpdateExpression='SET invite_code = if_not_exists(invite_code, :code) ADD version :one',
+                # Don't create a stub item for a group that doesn't exist
+                ConditionExpression='attribute_exists(group_id)',
+                ExpressionAttributeValues={
+                    ':code': shortuuid.ShortUUID().random(length=6).upper(),
+                    ':one': 1,
+                },
+                ReturnValues='ALL_NEW'
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            return None
+        invite_code = response['Attributes'].get('invite_code')
+        invite_code_cache.set(group_id, invite_code)
         return invite_code
 
     def get_group_by_invite_code(self, invite_code: str) -> Optional[Dict[str, Any]]:
@@ -175,15 +259,78 @@ class DynamoDBService:
         """Get group by ID"""
         response = self.groups_table.get_item(Key={'group_id': group_id})
         item = response.get('Item')
-        return decimal_to_float(item) if item else None
+        if not item:
+            return None
+
+        # Groups created before member_count was denormalized get it
+        # backfilled on first read
+        if 'member_count' not in item:
+            count = self.get_group_member_count(group_id)
+            response = self.groups_table.update_item(
+                Key={'group_id': group_id},
+                UpdateExpression='SET member_count = if_not_exists(member_count, :count)',
+                ExpressionAttributeValues={':count': count},
+                ReturnValues='ALL_NEW'
+            )
+            item = response['Attributes']
+
+        return decimal_to_float(item)
+
+    def get_group_version(self, group_id: int) -> Optional[int]:
+        """
+        Change counter for the group's cached views (group info, members,
+        events, photos). None if the group doesn't exist.
+        """
+        response = self.groups_table.get_item(
+            Key={'group_id': group_id},
+            ProjectionExpression='version, group_id'
+        )
+        item = response.get('Item')
+        return int(item.get('version', 0)) if item else None
+
+    def get_payments_version(self, group_id: int) -> Optional[int]:
+        """
+        Change counter for the group's payment views (balances, statistics):
+        moves whenever a member or a payment changes (both counters only
+        ever increase, so their sum does too). None if the group doesn't exist.
+        """
+        response = self.groups_table.get_item(
+            Key={'group_id': group_id},
+            ProjectionExpression='version, payments_version, group_id'
+        )
+        item = response.get('Item')
+        if not item:
+            return None
+        return int(item.get('version', 0)) + int(item.get('payments_version', 0))
+
+    def _bump_group_version(self, group_id: int, counter: str = 'version') -> None:
+        """
+        DynamoDB has no triggers, so every write that changes a cached group
+        view calls this (or folds ADD version into its own update). Payment
+        writes bump 'payments_version' instead.
+        """
+        try:
+            self.groups_table.update_item(
+                Key={'group_id': group_id},
+                UpdateExpression=f'ADD {counter} :one',
+                ConditionExpression='attribute_exists(group_id)',
+                ExpressionAttributeValues={':one': 1}
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
 
     def get_group_invite_code(self, group_id: int) -> Optional[str]:
         """
         Get the invite code for a group.
         Returns None if the group doesn't exist or doesn't have an invite code yet.
         """
+        invite_code = invite_code_cache.get(group_id)
+        if invite_code is not None:
+            return invite_code
+
         group = self.get_group_by_id(group_id)
         if group and group.get('invite_code'):
+            invite_code_cache.set(group_id, group['invite_code'])
             return group['invite_code']
         return None
 
@@ -200,7 +347,8 @@ class DynamoDBService:
             expr_attr_names[placeholder] = key
             expr_attr_values[value_placeholder] = value
 
-        update_expression = "SET " + ", ".join(update_expr_parts)
+        update_expression = "SET " + ", ".join(update_expr_parts) + " ADD version :version_one"
+        expr_attr_values[':version_one'] = 1
 
         response = self.groups_table.update_item(
             Key={'group_id': group_id},
@@ -209,6 +357,8 @@ class DynamoDBService:
             ExpressionAttributeValues=expr_attr_values,
             ReturnValues='ALL_NEW'
         )
+        if 'invite_code' in updates:
+            invite_code_cache.pop(group_id)
         return decimal_to_float(response['Attributes'])
 
     def get_group_settings(self, group_id: int) -> Dict[str, Any]:
@@ -228,10 +378,45 @@ class DynamoDBService:
     # ==================== GROUP MEMBER METHODS ====================
 
     def add_group_member(self, member_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Add a member to a group"""
+        """Add a member to a group, bumping the group's member_count"""
+        item = self._member_item(member_data)
+        try:
+            self.dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Put': {
+                    'TableName': self.group_members_table.name,
+                    'Item': item,
+                    'ConditionExpression': 'attribute_not_exists(user_id)'
+                }},
+                self._member_count_update(item['group_id'], 1),
+            ])
+        except self.dynamodb.meta.client.exceptions.TransactionCanceledException as e:
+            if not self._member_condition_failed(e):
+                raise
+            # Already a member: overwrite the row, the count is unchanged
+            self.group_members_table.put_item(Item=item)
+        membership_cache.pop(item['user_id'])
+        return decimal_to_float(item)
+
+    def _member_count_update(self, group_id: int, delta: int) -> Dict[str, Any]:
+        """TransactWriteItems entry adjusting groups.member_count by delta (and bumping version)"""
+        return {'Update': {
+            'TableName': self.groups_table.name,
+            'Key': {'group_id': group_id},
+            'UpdateExpression': 'ADD member_count :delta, version :one',
+            'ConditionExpression': 'attribute_exists(group_id)',
+            'ExpressionAttributeValues': {':delta': delta, ':one': 1}
+        }}
+
+    @staticmethod
+    def _member_condition_failed(error) -> bool:
+        """True if a member transaction was cancelled by its first (member row) condition"""
+        reasons = error.response.get('CancellationReasons') or []
+        return bool(reasons) and reasons[0].get('Code') == 'ConditionalCheckFailed'
+
+    def _member_item(self, member_data: Dict[str, Any]) -> Dict[str, Any]:
         joined_at = member_data.get('joined_at', datetime.utcnow().isoformat())
 
-        item = {
+        return {
             'group_id': member_data['group_id'],
             'user_id': member_data['user_id'],
             'role': member_data.get('role', 'member'),
@@ -240,11 +425,48 @@ class DynamoDBService:
             'balance': float_to_decimal(member_data.get('balance', 0.0))
         }
 
-        self.group_members_table.put_item(Item=item)
-        return decimal_to_float(item)
+    def signup_atomic(
+        self,
+        user_data: Dict[str, Any],
+        group_data: Optional[Dict[str, Any]],
+        member_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Create a user, optionally a new group (with a fresh invite code),
+        and the user's membership in one TransactWriteItems call.
+
+        Returns {"group_id": int, "invite_code": str | None}.
+        """
+        # The resource's client accepts native Python types, like Table.put_item
+        def put(table, item):
+            return {'Put': {'TableName': table.name, 'Item': item}}
+
+        transact_items = [put(self.users_table, self._user_item(user_data))]
+
+        group_id = member_data.get('group_id')
+        invite_code = None
+        if group_data is not None:
+            invite_code = shortuuid.ShortUUID().random(length=6).upper()
+            group_item = self._group_item(
+                {**group_data, 'invite_code': invite_code, 'member_count': 1}
+            )
+            group_id = group_item['group_id']
+            transact_items.append(put(self.groups_table, group_item))
+        else:
+            transact_items.append(self._member_count_update(group_id, 1))
+
+        member_item = self._member_item({**member_data, 'group_id': group_id})
+        transact_items.append(put(self.group_members_table, member_item))
+
+        self.dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+        return {'group_id': group_id, 'invite_code': invite_code}
 
     def get_user_membership(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """Get user's group membership using GSI"""
+        """Get user's group membership using GSI (served from membership_cache when possible)"""
+        cached = membership_cache.get(user_id)
+        if cached is not None:
+            return dict(cached)
+
         response = self.group_members_table.query(
             IndexName='UserIndex',
             KeyConditionExpression=Key('user_id').eq(user_id)
@@ -261,35 +483,100 @@ class DynamoDBService:
             membership['group_name'] = group['name']
             membership['group_invite_code'] = group.get('invite_code', '')
 
-        return membership
+        membership_cache.set(user_id, membership)
+        return dict(membership)
 
     def get_group_members(self, group_id: int) -> List[Dict[str, Any]]:
         """Get all members of a group with user details"""
         response = self.group_members_table.query(
             KeyConditionExpression=Key('group_id').eq(group_id)
         )
-        members = response.get('Items', [])
+        members = decimal_to_float(response.get('Items', []))
 
-        # Enrich with user details
-        result = []
+        # Enrich with user details, fetched in one batch rather than per member
+        users = self.get_users_by_ids([member['user_id'] for member in members])
         for member in members:
-            member = decimal_to_float(member)
-            user = self.get_user_by_id(member['user_id'])
+            user = users.get(member['user_id'])
             if user:
                 member['email'] = user['email']
-                member['display_name'] = user['display_name']
+                member['display_name'] = user.get('display_name')
                 member['phone'] = user.get('phone', '')
-            result.append(member)
 
-        return result
+        return members
+
+    def get_member_bundle(self, group_id: int, user_id: str) -> Optional[Dict[str, Any]]:
+        """
+        One member of a group: user profile plus membership fields, fetched
+        from both tables in a single BatchGetItem. None if not a member.
+        """
+        users_name = self.users_table.name
+        members_name = self.group_members_table.name
+        request_items = {
+            users_name: {'Keys': [{'user_id': user_id}]},
+            members_name: {'Keys': [{'group_id': group_id, 'user_id': user_id}]},
+        }
+
+        found: Dict[str, Dict[str, Any]] = {}
+        while request_items:
+            response = self.dynamodb.batch_get_item(RequestItems=request_items)
+            for table_name, items in response.get('Responses', {}).items():
+                if items:
+                    found[table_name] = decimal_to_float(items[0])
+            request_items = response.get('UnprocessedKeys')
+
+        user = found.get(users_name)
+        membership = found.get(members_name)
+        if not user or not membership:
+            return None
+
+        user.pop('password_hash', None)
+        return {**user, **membership}
+
+    def get_member_bundles(
+        self, group_id: int, user_ids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Batch version of get_member_bundle, keyed by user_id: membership rows
+        via BatchGetItem, then their users in one get_users_by_ids. Users who
+        aren't members of that group are simply absent.
+        """
+        ids = list(dict.fromkeys(user_ids))
+        table_name = self.group_members_table.name
+        memberships: Dict[str, Dict[str, Any]] = {}
+
+        for i in range(0, len(ids), 100):
+            keys = [{'group_id': group_id, 'user_id': uid} for uid in ids[i:i + 100]]
+            request_items = {table_name: {'Keys': keys}}
+            while request_items:
+                response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                for item in response.get('Responses', {}).get(table_name, []):
+                    membership = decimal_to_float(item)
+                    memberships[membership['user_id']] = membership
+                request_items = response.get('UnprocessedKeys')
+
+        users = self.get_users_by_ids(list(memberships))
+        bundles: Dict[str, Dict[str, Any]] = {}
+        for uid, membership in memberships.items():
+            user = users.get(uid)
+            if user:
+                user.pop('password_hash', None)
+                bundles[uid] = {**user, **membership}
+        return bundles
 
     def get_group_admin_count(self, group_id: int) -> int:
-        """Get count of admins in a group"""
-        response = self.group_members_table.query(
-            KeyConditionExpression=Key('group_id').eq(group_id),
-            FilterExpression=Attr('role').eq('admin')
-        )
-        return len(response.get('Items', []))
+        """Get count of admins in a group (COUNT only, no items returned)"""
+        query_params = {
+            'KeyConditionExpression': Key('group_id').eq(group_id),
+            'FilterExpression': Attr('role').eq('admin'),
+            'Select': 'COUNT'
+        }
+        count = 0
+        while True:
+            response = self.group_members_table.query(**query_params)
+            count += response.get('Count', 0)
+            if 'LastEvaluatedKey' not in response:
+                return count
+            query_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
 
     def get_group_member_count(self, group_id: int) -> int:
         """Get total count of members in a group"""
@@ -300,23 +587,58 @@ class DynamoDBService:
         return response.get('Count', 0)
 
     def update_member_role(self, group_id: int, user_id: str, role: str) -> Dict[str, Any]:
-        """Update a member's role"""
-        response = self.group_members_table.update_item(
-            Key={'group_id': group_id, 'user_id': user_id},
-            UpdateExpression='SET #role = :role',
-            ExpressionAttributeNames={'#role': 'role'},
-            ExpressionAttributeValues={':role': role},
-            ReturnValues='ALL_NEW'
+        """
+        Update a member's role. Returns {} if the user isn't in the group
+        or the change would demote the group's last admin.
+        """
+        member_exists = Attr('user_id').exists()
+        if role == 'admin':
+            return self._set_member_role(group_id, user_id, role, member_exists)
+
+        # DynamoDB can't count inside a condition. A non-admin target can't
+        # be the last admin, so try that first; the admin count (a group-wide
+        # query) is only read when the target turns out to be an admin. The
+        # race window is far narrower than a handler check.
+        updated = self._set_member_role(
+            group_id, user_id, role, member_exists & Attr('role').ne('admin')
         )
+        if updated or self.get_group_admin_count(group_id) <= 1:
+            return updated
+        return self._set_member_role(group_id, user_id, role, member_exists)
+
+    def _set_member_role(self, group_id: int, user_id: str, role: str, condition) -> Dict[str, Any]:
+        try:
+            response = self.group_members_table.update_item(
+                Key={'group_id': group_id, 'user_id': user_id},
+                UpdateExpression='SET #role = :role',
+                ConditionExpression=condition,
+                ExpressionAttributeNames={'#role': 'role'},
+                ExpressionAttributeValues={':role': role},
+                ReturnValues='ALL_NEW'
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            return {}
+        finally:
+            membership_cache.pop(user_id)
+        self._bump_group_version(group_id)
         return decimal_to_float(response['Attributes'])
 
     def update_member_balance(self, user_id: str, group_id: int, amount: float) -> None:
-        """Update member's balance"""
-        self.group_members_table.update_item(
-            Key={'group_id': group_id, 'user_id': user_id},
-            UpdateExpression='SET balance = balance + :amount',
-            ExpressionAttributeValues={':amount': float_to_decimal(amount)}
-        )
+        """
+        Update member's balance. ADD treats a missing balance as 0; the
+        condition keeps it from creating a bare item for someone who has
+        since left the group.
+        """
+        try:
+            self.group_members_table.update_item(
+                Key={'group_id': group_id, 'user_id': user_id},
+                UpdateExpression='ADD balance :amount',
+                ConditionExpression='attribute_exists(user_id)',
+                ExpressionAttributeValues={':amount': float_to_decimal(amount)}
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
+        membership_cache.pop(user_id)
 
     def get_user_balance(self, user_id: str, group_id: int) -> float:
         """Get user's balance in a group"""
@@ -329,22 +651,53 @@ class DynamoDBService:
             return float(balance)
         return 0.0
 
-    def remove_member(self, user_id: str, group_id: int) -> None:
-        """Remove a member from a group"""
-        self.group_members_table.delete_item(
-            Key={'group_id': group_id, 'user_id': user_id}
-        )
+    def remove_member(self, user_id: str, group_id: int) -> bool:
+        """
+        Remove a member from a group, decrementing the group's member_count.
+        Returns False if the user isn't in the group or is its last admin.
+        """
+        # Same last-admin guard as update_member_role: only count admins
+        # once the target turns out to be one
+        if self._delete_member(group_id, user_id, 'attribute_exists(user_id) AND #role <> :admin'):
+            return True
+        if self.get_group_admin_count(group_id) <= 1:
+            return False
+        return self._delete_member(group_id, user_id, 'attribute_exists(user_id)')
+
+    def _delete_member(self, group_id: int, user_id: str, condition: str) -> bool:
+        delete = {
+            'TableName': self.group_members_table.name,
+            'Key': {'group_id': group_id, 'user_id': user_id},
+            'ConditionExpression': condition
+        }
+        if '#role' in condition:
+            delete['ExpressionAttributeNames'] = {'#role': 'role'}
+            delete['ExpressionAttributeValues'] = {':admin': 'admin'}
 
-    def remove_group_member(self, group_id: int, user_id: str) -> None:
+        try:
+            self.dynamodb.meta.client.transact_write_items(TransactItems=[
+                {'Delete': delete},
+                self._member_count_update(group_id, -1),
+            ])
+        except self.dynamodb.meta.client.exceptions.TransactionCanceledException as e:
+            # Not a member (or guarded admin): nothing deleted, nothing to count
+            if not self._member_condition_failed(e):
+                raise
+            return False
+        finally:
+            membership_cache.pop(user_id)
+        return True
+
+    def remove_group_member(self, group_id: int, user_id: str) -> bool:
         """Alias for remove_member"""
-        self.remove_member(user_id, group_id)
+        return self.remove_member(user_id, group_id)
 
     # ==================== EVENT METHODS ====================
 
-    def create_event(self, event_data: Dict[str, Any]) -> None:
-        """Create a new event"""
+    def create_event(self, event_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Create a new event and return the stored item"""
         # Use the event_id from event_data if provided, otherwise generate one
-        event_id = event_data.get('event_id', str(uuid.uuid4()))
+        event_id = event_data.get('event_id', uuid.uuid4().hex)
         created_at = event_data.get('created_at', datetime.utcnow().isoformat())
 
         item = {
@@ -361,6 +714,8 @@ class DynamoDBService:
         }
 
         self.events_table.put_item(Item=item)
+        self._bump_group_version(item['group_id'])
+        return decimal_to_float(item)
 
     def get_event_by_id(self, event_id: str) -> Optional[Dict[str, Any]]:
         """Get event by ID"""
@@ -377,9 +732,17 @@ class DynamoDBService:
         group_id: int,
         start_date: Optional[str] = None,
         end_date: Optional[str] = None,
-        event_type: Optional[str] = None
+        event_type: Optional[str] = None,
+        limit: Optional[int] = None,
+        after: Optional[Tuple[str, str, str]] = None
     ) -> List[Dict[str, Any]]:
-        """Get events for a group with optional filters"""
+        """
+        Get events for a group with optional filters.
+
+        With limit or after (a keyset cursor: event_date, event_time,
+        event_id of the last event seen) events come back in ascending
+        GroupIndex order, a page at a time; otherwise all of them, newest first.
+        """
         # Build query
         key_condition = Key('group_id').eq(group_id)
 
@@ -398,6 +761,9 @@ class DynamoDBService:
         if event_type:
             query_params['FilterExpression'] = Attr('event_type').eq(event_type)
 
+        if limit is not None or after is not None:
+            return decimal_to_float(self._query_event_page(query_params, group_id, limit, after))
+
         response = self.events_table.query(**query_params)
         events = response.get('Items', [])
 
@@ -406,8 +772,48 @@ class DynamoDBService:
 
         return decimal_to_float(events)
 
-    def update_event(self, event_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
-        """Update event information"""
+    def _query_event_page(
+        self,
+        query_params: Dict[str, Any],
+        group_id: int,
+        limit: Optional[int],
+        after: Optional[Tuple[str, str, str]]
+    ) -> List[Dict[str, Any]]:
+        """
+        One page of GroupIndex results in index order. Limit applies before
+        FilterExpression, so keep reading until the page is full.
+        """
+        query_params = {**query_params, 'ScanIndexForward': True}
+        if after:
+            query_params['ExclusiveStartKey'] = {
+                'group_id': group_id,
+                'event_date': after[0],
+                'event_id': after[2],
+            }
+
+        events: List[Dict[str, Any]] = []
+        while True:
+            if limit is not None:
+                query_params['Limit'] = limit - len(events)
+            response = self.events_table.query(**query_params)
+            events.extend(response.get('Items', []))
+            if (limit is not None and len(events) >= limit) or 'LastEvaluatedKey' not in response:
+                return events
+            query_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def update_event(
+        self, event_id: str, updates: Dict[str, Any], group_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Update event information. With group_id, only an event in that
+        group is touched; {} means nothing matched.
+        """
+        if not updates:
+            event = self.get_event_by_id(event_id) or {}
+            if group_id is not None and event.get('group_id') != group_id:
+                return {}
+            return event
+
         update_expr_parts = []
         expr_attr_names = {}
         expr_attr_values = {}
@@ -421,25 +827,55 @@ class DynamoDBService:
 
         update_expression = "SET " + ", ".join(update_expr_parts)
 
-        response = self.events_table.update_item(
-            Key={'event_id': event_id},
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expr_attr_names,
-            ExpressionAttributeValues=expr_attr_values,
-            ReturnValues='ALL_NEW'
-        )
-        return decimal_to_float(response['Attributes'])
+        kwargs = {}
+        if group_id is not None:
+            # Also keeps update_item from creating a stub for a missing event
+            kwargs['ConditionExpression'] = Attr('group_id').eq(group_id)
 
-    def delete_event(self, event_id: str) -> None:
-        """Delete an event"""
-        self.events_table.delete_item(Key={'event_id': event_id})
+        try:
+            response = self.events_table.update_item(
+                Key={'event_id': event_id},
+                UpdateExpression=update_expression,
+                ExpressionAttributeNames=expr_attr_names,
+                ExpressionAttributeValues=expr_attr_values,
+                ReturnValues='ALL_NEW',
+                **kwargs
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            return {}
+        event = decimal_to_float(response['Attributes'])
+        if 'group_id' in event:
+            self._bump_group_version(event['group_id'])
+        return event
+
+    def delete_event(self, event_id: str, group_id: Optional[int] = None) -> bool:
+        """
+        Delete an event (only within group_id, if given).
+        Returns False if nothing was deleted.
+        """
+        kwargs = {}
+        if group_id is not None:
+            kwargs['ConditionExpression'] = Attr('group_id').eq(group_id)
+
+        try:
+            response = self.events_table.delete_item(
+                Key={'event_id': event_id},
+                ReturnValues='ALL_OLD',
+                **kwargs
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        if 'Attributes' not in response:
+            return False
+        self._bump_group_version(decimal_to_float(response['Attributes']['group_id']))
+        return True
 
     # ==================== PAYMENT METHODS ====================
 
-    def create_payment(self, payment_data: dict) -> None:
-        """Create a new payment and update member balance"""
+    def create_payment(self, payment_data: dict) -> Dict[str, Any]:
+        """Create a new payment, update member balance and return the item"""
         # Use the payment_id from payment_data if provided, otherwise generate one
-        payment_id = payment_data.get('payment_id', str(uuid.uuid4()))
+        payment_id = payment_data.get('payment_id', uuid.uuid4().hex)
         created_at = payment_data.get('created_at', datetime.utcnow().isoformat())
 
         item = {
@@ -460,21 +896,53 @@ class DynamoDBService:
         self.payments_table.put_item(Item=item)
 
         # Update member balance
-        amount = payment_data['amount']
-        payment_type = payment_data.get('payment_type', 'CHARGE')
-
-        if payment_type == 'CHARGE':
-            self.update_member_balance(
-                payment_data['user_id'],
-                payment_data['group_id'],
-                amount
-            )
-        elif payment_type == 'CREDIT':
-            self.update_member_balance(
-                payment_data['user_id'],
-                payment_data['group_id'],
-                -amount
-            )
+        payment = decimal_to_float(item)
+        delta = _balance_contribution(payment)
+        if delta:
+            self.update_member_balance(payment['user_id'], payment['group_id'], delta)
+        self._bump_group_version(payment['group_id'], 'payments_version')
+
+        return payment
+
+    def create_payments_bulk(self, payments: List[dict]) -> List[Dict[str, Any]]:
+        """
+        Batch version of create_payment: items are written with BatchWriteItem
+        and each member's balance gets one update for their combined amount.
+        Returns the stored items in input order.
+        """
+        items = []
+        deltas: Dict[Tuple[str, int], float] = {}
+        with self.payments_table.batch_writer() as batch:
+            for payment_data in payments:
+                payment_type = payment_data.get('payment_type', 'CHARGE')
+                item = {
+                    'payment_id': payment_data['payment_id'],
+                    'group_id': payment_data['group_id'],
+                    'user_id': payment_data['user_id'],
+                    'user_name': payment_data.get('user_name', ''),
+                    'amount': float_to_decimal(payment_data['amount']),
+                    'description': payment_data.get('description', ''),
+                    'payment_type': payment_type,
+                    'status': payment_data.get('status', 'PENDING'),
+                    'due_date': payment_data.get('due_date', ''),
+                    'paid_date': payment_data.get('paid_date', ''),
+                    'created_by': payment_data.get('created_by', ''),
+                    'created_at': payment_data['created_at']
+                }
+                batch.put_item(Item=item)
+                payment = decimal_to_float(item)
+                items.append(payment)
+
+                key = (payment['user_id'], payment['group_id'])
+                deltas[key] = deltas.get(key, 0) + _balance_contribution(payment)
+
+        for (user_id, group_id), delta in deltas.items():
+            if delta:
+                self.update_member_balance(user_id, group_id, delta)
+        for group_id in {group_id for _, group_id in deltas}:
+            self._bump_group_version(group_id, 'payments_version')
+
+        return items
 
     def get_payment(self, payment_id: str) -> Optional[Dict[str, Any]]:
         """Get payment by ID"""
@@ -486,6 +954,23 @@ class DynamoDBService:
         """Alias for get_payment"""
         return self.get_payment(payment_id)
 
+    def get_payment_scoped(
+        self, payment_id: str, group_id: int, user_id: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        A payment plus the payer's email and display_name, only if it
+        belongs to group_id (and to user_id, when given)
+        """
+        payment = self.get_payment(payment_id)
+        if not payment or payment['group_id'] != group_id:
+            return None
+        if user_id is not None and payment['user_id'] != user_id:
+            return None
+        user = self.get_user_by_id(payment['user_id']) or {}
+        payment['email'] = user.get('email')
+        payment['display_name'] = user.get('display_name')
+        return payment
+
     def get_group_payments(
         self,
         group_id: int,
@@ -513,6 +998,49 @@ class DynamoDBService:
         response = self.payments_table.query(**query_params)
         return decimal_to_float(response.get('Items', []))
 
+    def get_payment_statistics(self, group_id: int) -> Dict[str, Any]:
+        """
+        Group payment totals: money owed (sum of positive member balances),
+        money collected (paid charges) and the payment count. Only the
+        attributes needed are projected. Keys match PaymentStatisticsResponse.
+        """
+        total_money_owed = Decimal('0')
+        query_params = {
+            'KeyConditionExpression': Key('group_id').eq(group_id),
+            'FilterExpression': Attr('balance').gt(0),
+            'ProjectionExpression': 'balance',
+        }
+        while True:
+            response = self.group_members_table.query(**query_params)
+            total_money_owed += sum(item['balance'] for item in response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        total_money_collected = Decimal('0')
+        total_payments_count = 0
+        query_params = {
+            'IndexName': 'GroupIndex',
+            'KeyConditionExpression': Key('group_id').eq(group_id),
+            'ProjectionExpression': 'amount, payment_type, #status',
+            'ExpressionAttributeNames': {'#status': 'status'},
+        }
+        while True:
+            response = self.payments_table.query(**query_params)
+            for item in response.get('Items', []):
+                total_payments_count += 1
+                if item['payment_type'] == 'CHARGE' and item['status'] == 'PAID':
+                    total_money_collected += item['amount']
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        return {
+            'total_money_owed': float(total_money_owed),
+            'total_money_collected': float(total_money_collected),
+            'total_payments_count': total_payments_count,
+        }
+
     def get_user_payments(self, user_id: str) -> List[Dict[str, Any]]:
         """Get all payments for a user"""
         # Need to scan since we don't have a user_id GSI on payments
@@ -546,31 +1074,92 @@ class DynamoDBService:
             ExpressionAttributeValues=expr_attr_values,
             ReturnValues='ALL_NEW'
         )
-        return decimal_to_float(response['Attributes'])
+        payment = decimal_to_float(response['Attributes'])
+        self._bump_group_version(payment['group_id'], 'payments_version')
+        return payment
 
-    def delete_payment(self, payment_id: str) -> None:
-        """Delete a payment and reverse balance changes"""
-        # Get payment first to reverse balance
-        payment = self.get_payment(payment_id)
-        if payment:
-            amount = payment['amount']
-            payment_type = payment['payment_type']
-
-            # Reverse balance change
-            if payment_type == 'CHARGE':
-                self.update_member_balance(
-                    payment['user_id'],
-                    payment['group_id'],
-                    -amount
-                )
-            elif payment_type == 'CREDIT':
-                self.update_member_balance(
-                    payment['user_id'],
-                    payment['group_id'],
-                    amount
-                )
-
-        self.payments_table.delete_item(Key={'payment_id': payment_id})
+    def update_payment_status(
+        self,
+        payment_id: str,
+        group_id: int,
+        status: str,
+        owner_id: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Set a payment's status (stamping paid_date on PAID, clearing it on
+        PENDING) and adjust the member's balance by the change in what the
+        payment contributes to it (see _balance_contribution). The write
+        is conditioned on group_id, and on owner_id when given. Returns the
+        updated payment plus the payer's email and display_name, or {} if
+        nothing matched.
+        """
+        condition = Attr('group_id').eq(group_id)
+        if owner_id is not None:
+            condition &= Attr('user_id').eq(owner_id)
+
+        update_expression = 'SET #status = :status'
+        expr_attr_names = {'#status': 'status'}
+        expr_attr_values: Dict[str, Any] = {':status': status}
+        if status in ('PAID', 'PENDING'):
+            update_expression += ', #paid_date = :paid_date'
+            expr_attr_names['#paid_date'] = 'paid_date'
+            expr_attr_values[':paid_date'] = (
+                datetime.utcnow().date().isoformat() if status == 'PAID' else None
+            )
+
+        try:
+            response = self.payments_table.update_item(
+                Key={'payment_id': payment_id},
+                UpdateExpression=update_expression,
+                ConditionExpression=condition,
+                ExpressionAttributeNames=expr_attr_names,
+                ExpressionAttributeValues=expr_attr_values,
+                ReturnValues='ALL_OLD'
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            return {}
+
+        old = decimal_to_float(response['Attributes'])
+        payment = {**old, **{name: expr_attr_values[f':{name}'] for name in expr_attr_names.values()}}
+
+        delta = _balance_contribution(payment) - _balance_contribution(old)
+        if delta:
+            self.update_member_balance(payment['user_id'], group_id, delta)
+        self._bump_group_version(group_id, 'payments_version')
+
+        user = self.get_user_by_id(payment['user_id']) or {}
+        payment['email'] = user.get('email')
+        payment['display_name'] = user.get('display_name')
+        return payment
+
+    def delete_payment(self, payment_id: str, group_id: Optional[int] = None) -> bool:
+        """
+        Delete a payment (only within group_id, when given) and take its
+        contribution out of the balance. Returns False if nothing was deleted.
+        """
+        kwargs: Dict[str, Any] = {}
+        if group_id is not None:
+            kwargs['ConditionExpression'] = Attr('group_id').eq(group_id)
+
+        try:
+            response = self.payments_table.delete_item(
+                Key={'payment_id': payment_id},
+                ReturnValues='ALL_OLD',
+                **kwargs
+            )
+        except self.dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+        payment = response.get('Attributes')
+        if not payment:
+            return False
+
+        payment = decimal_to_float(payment)
+        delta = _balance_contribution(payment)
+        if delta:
+            self.update_member_balance(payment['user_id'], payment['group_id'], -delta)
+        self._bump_group_version(payment['group_id'], 'payments_version')
+        return True
 
     # ==================== MESSAGE METHODS ====================
 
@@ -671,6 +1260,7 @@ class DynamoDBService:
         }
 
         self.photos_table.put_item(Item=item)
+        self._bump_group_version(item['group_id'])
         return decimal_to_float(item)
 
     def get_photo_by_id(self, photo_id: str) -> Optional[Dict[str, Any]]:
@@ -721,11 +1311,19 @@ class DynamoDBService:
             ExpressionAttributeValues=expr_attr_values,
             ReturnValues='ALL_NEW'
         )
-        return decimal_to_float(response['Attributes'])
+        photo = decimal_to_float(response['Attributes'])
+        self._bump_group_version(photo['group_id'])
+        return photo
 
     def delete_photo(self, photo_id: str) -> None:
         """Delete a photo"""
-        self.photos_table.delete_item(Key={'photo_id': photo_id})
+        response = self.photos_table.delete_item(
+            Key={'photo_id': photo_id},
+            ReturnValues='ALL_OLD'
+        )
+        photo = response.get('Attributes')
+        if photo:
+            self._bump_group_version(decimal_to_float(photo['group_id']))
 
     def get_group_photo_count(self, group_id: int) -> int:
         """Get count of photos in a group"""
@@ -1,7 +1,10 @@
+import logging
 import boto3
 from typing import List
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 class EmailService:
     def __init__(self):
         self.client = boto3.client(
@@ -78,5 +81,5 @@ class EmailService:
             )
             return {"success": True, "messageId": response['MessageId']}
         except Exception as e:
-            print(f"Email send error: {e}")
+            logger.warning("Email send error: %s", e)
             return {"success": False, "error": str(e)}
\ No newline at end of file
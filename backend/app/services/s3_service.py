@@ -1,3 +1,4 @@
+import logging
 import os
 from pathlib import Path
 from typing import Dict, Any, Optional
@@ -6,6 +7,8 @@ import shutil
 
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 
 class LocalStorageService:
     """Local file storage service for development/testing without AWS"""
@@ -41,6 +44,21 @@ class LocalStorageService:
         relative_path = f"groups/{group_id}/photos/{photo_id}.{ext}"
         return f"{self.url_prefix}/{relative_path}"
 
+    def upload_thumbnail(self, data: bytes, group_id: str, photo_id: str) -> str:
+        """Store an encoded JPEG thumbnail next to its photo and return the URL."""
+        group_dir = self.storage_path / "groups" / str(group_id) / "photos"
+        group_dir.mkdir(parents=True, exist_ok=True)
+        (group_dir / f"{photo_id}_thumb.jpg").write_bytes(data)
+
+        relative_path = f"groups/{group_id}/photos/{photo_id}_thumb.jpg"
+        return f"{self.url_prefix}/{relative_path}"
+
+    def local_path(self, url_or_path: str) -> Path:
+        """Filesystem path of a stored photo, given its URL or relative path."""
+        if url_or_path.startswith(self.url_prefix + "/"):
+            url_or_path = url_or_path[len(self.url_prefix) + 1:]
+        return self.storage_path / url_or_path
+
     def delete_photo(self, url_or_path: str) -> bool:
         """Delete photo from local storage"""
         try:
@@ -57,7 +75,7 @@ class LocalStorageService:
                 return True
             return False
         except Exception as e:
-            print(f"Error deleting photo: {e}")
+            logger.warning("Error deleting photo %s: %s", url_or_path, e)
             return False
 
     def get_photo_url(self, url_or_path: str) -> str:
@@ -123,6 +141,21 @@ class S3Service:
 
         return self._object_url(key)
 
+    def upload_thumbnail(self, data: bytes, group_id: str, photo_id: str) -> str:
+        """Store an encoded JPEG thumbnail next to its photo and return the URL."""
+        key = f"groups/{group_id}/photos/{photo_id}_thumb.jpg"
+        self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=data, ContentType="image/jpeg"
+        )
+        return self._object_url(key)
+
+    def download_photo(self, url_or_key: str) -> bytes:
+        """Fetch a stored photo's bytes (used off the request path)."""
+        response = self.client.get_object(
+            Bucket=self.bucket, Key=self._key_from_url(url_or_key)
+        )
+        return response["Body"].read()
+
     def delete_photo(self, url_or_key: str) -> bool:
         """Delete photo from S3, accepting either a full URL or a key."""
         try:
@@ -130,7 +163,7 @@ class S3Service:
             self.client.delete_object(Bucket=self.bucket, Key=key)
             return True
         except Exception as e:
-            print(f"Error deleting photo: {e}")
+            logger.warning("Error deleting photo %s: %s", url_or_key, e)
             return False
 
     def get_photo_url(self, url_or_key: str) -> str:
@@ -180,7 +213,7 @@ class S3Service:
             )
             return url
         except Exception as e:
-            print(f"Error generating presigned URL: {e}")
+            logger.warning("Error generating presigned URL for %s: %s", key_or_url, e)
             return None
 
 
@@ -204,6 +237,23 @@ def upload_photo(file, group_id: str, photo_id: str) -> str:
     return _storage_service.upload_photo(file, group_id, photo_id)
 
 
+def upload_thumbnail(data: bytes, group_id: str, photo_id: str) -> str:
+    """Wrapper used by the thumbnail task to store a thumbnail and return URL."""
+    return _storage_service.upload_thumbnail(data, group_id, photo_id)
+
+
+def local_photo_path(key_or_url: str) -> Optional[str]:
+    """Filesystem path of a stored photo, or None when photos live in S3."""
+    if isinstance(_storage_service, LocalStorageService):
+        return str(_storage_service.local_path(key_or_url))
+    return None
+
+
+def download_photo(key_or_url: str) -> bytes:
+    """Wrapper used by the thumbnail task to fetch a photo from S3."""
+    return _storage_service.download_photo(key_or_url)
+
+
 def get_photo_url(key_or_url: str) -> str:
     """Wrapper used by photos API to get a URL for a photo."""
     return _storage_service.get_photo_url(key_or_url)
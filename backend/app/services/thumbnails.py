@@ -0,0 +1,46 @@
+import logging
+
+from app.services.db_service import get_db_service
+from app.services.s3_service import download_photo, local_photo_path, upload_thumbnail
+
+logger = logging.getLogger(__name__)
+
+# Optional: pyvips needs the libvips system library. Without it photos are
+# stored without thumbnails (thumbnail_url stays None).
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
+
+THUMBNAIL_SIZE = 256  # longest side, in pixels
+
+
+def thumbnails_enabled() -> bool:
+    return pyvips is not None
+
+
+def make_thumbnail(photo_url: str) -> bytes:
+    """
+    Resize a stored photo to a THUMBNAIL_SIZE JPEG. pyvips decodes with
+    shrink-on-load, so large JPEGs are never fully expanded; local photos
+    are read straight from their file, S3 ones fetched with one GET.
+    """
+    path = local_photo_path(photo_url)
+    if path is not None:
+        image = pyvips.Image.thumbnail(path, THUMBNAIL_SIZE)
+    else:
+        image = pyvips.Image.thumbnail_buffer(download_photo(photo_url), THUMBNAIL_SIZE)
+    return image.jpegsave_buffer(Q=80, strip=True)
+
+
+def generate_and_store_thumbnail(photo_url: str, group_id: int, photo_id: str) -> None:
+    """
+    Background task (run in the threadpool after the upload response is
+    sent): resize the stored photo, store the thumbnail next to it and
+    record its URL. Failures only mean the photo keeps showing at full size.
+    """
+    try:
+        thumbnail_url = upload_thumbnail(make_thumbnail(photo_url), group_id, photo_id)
+        get_db_service().update_photo(photo_id, {"thumbnail_url": thumbnail_url})
+    except Exception:
+        logger.exception("Thumbnail generation failed for photo %s", photo_id)
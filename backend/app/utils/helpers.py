@@ -1,9 +1,16 @@
-from datetime import datetime
-from typing import Optional
+import logging
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Any, AsyncIterator, Iterable, Optional
+
+import orjson
+from fastapi import HTTPException
+
+logger = logging.getLogger(__name__)
 
 def generate_timestamp() -> str:
-    """Generate ISO timestamp"""
-    return datetime.utcnow().isoformat()
+    """Generate ISO timestamp (UTC, with offset)"""
+    return datetime.now(timezone.utc).isoformat()
 
 def format_date(date_string: str) -> Optional[str]:
     """Format date string to ISO format"""
@@ -15,4 +22,47 @@ def format_date(date_string: str) -> Optional[str]:
 
 def clean_dict(d: dict) -> dict:
     """Remove None values from dictionary"""
-    return {k: v for k, v in d.items() if v is not None}
\ No newline at end of file
+    return {k: v for k, v in d.items() if v is not None}
+
+
+def db_endpoint(fn):
+    """
+    Wrap an async route handler so unexpected errors are logged with their
+    traceback and surface as a generic 500 (internal messages stay out of
+    responses), while HTTPExceptions raised by the handler pass through
+    untouched. Replaces the per-handler try/except scaffold.
+
+    This lives on the routes rather than in an app-level Exception handler
+    because those run outside CORSMiddleware, so browsers would see a CORS
+    failure instead of the 500.
+    """
+    @wraps(fn)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await fn(*args, **kwargs)
+        except HTTPException:
+            raise
+        except Exception:
+            logger.exception("Unhandled error in %s", fn.__name__)
+            raise HTTPException(status_code=500, detail="Internal server error")
+    return wrapper
+
+
+async def json_array_stream(items: Iterable[Any], chunk_size: int = 500) -> AsyncIterator[bytes]:
+    """
+    Encode items as a JSON array, chunk_size at a time, for a
+    StreamingResponse. With a lazy iterable, only the rows and the chunk
+    being sent are in memory, never every shaped item plus the whole body.
+    """
+    yield b"["
+    sep = b""
+    chunk = []
+    for item in items:
+        chunk.append(orjson.dumps(item))
+        if len(chunk) >= chunk_size:
+            yield sep + b",".join(chunk)
+            sep = b","
+            chunk = []
+    if chunk:
+        yield sep + b",".join(chunk)
+    yield b"]"
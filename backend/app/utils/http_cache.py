@@ -0,0 +1,79 @@
+# app/utils/http_cache.py
+
+import hashlib
+from typing import Any, Dict, List, Optional
+
+import orjson
+from fastapi import Request, Response
+
+from app.services.cache import SharedTTLCache
+
+# Clients may keep the body but must revalidate (If-None-Match) each time;
+# responses depend on the caller's auth, so shared caches must not store them
+_CACHE_CONTROL = "private, no-cache"
+
+
+def _if_none_match(request: Request) -> List[str]:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return []
+    return [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+
+class GroupViewCache:
+    """
+    Conditional GETs for read endpoints whose output depends only on one
+    group's data. ETags are built from the group's version counter, which
+    every relevant write bumps, so entries are never invalidated
+    explicitly: a write changes the version and with it the key.
+
+    Encoded bodies are kept per process for a short TTL, so a repeat hit
+    skips the DB query, model building and JSON encoding.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 30):
+        self._bodies = SharedTTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def etag(*parts: Any) -> str:
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+        return f'"{digest}"'
+
+    @staticmethod
+    def headers(etag: str) -> Dict[str, str]:
+        """Validator headers for a 200 built outside store() (e.g. streamed)."""
+        return {"ETag": etag, "Cache-Control": _CACHE_CONTROL}
+
+    @classmethod
+    def not_modified(cls, request: Request, etag: str) -> Optional[Response]:
+        """304 if the client already has this version, otherwise None."""
+        if etag in _if_none_match(request):
+            return Response(status_code=304, headers=cls.headers(etag))
+        return None
+
+    def lookup(self, request: Request, etag: str) -> Optional[Response]:
+        """
+        304 if the client already has this version, the cached 200 if this
+        process has it, otherwise None (build it and call store()).
+        """
+        response = self.not_modified(request, etag)
+        if response is not None:
+            return response
+
+        cached = self._bodies.get(etag)
+        if cached is not None:
+            body, headers = cached
+            return Response(content=body, media_type="application/json", headers=headers)
+        return None
+
+    def store(
+        self, etag: str, content: Any, headers: Optional[Dict[str, str]] = None
+    ) -> Response:
+        """Encode content once, cache it under etag and return it as a 200."""
+        body = orjson.dumps(content)
+        headers = {**(headers or {}), **self.headers(etag)}
+        self._bodies.set(etag, (body, headers))
+        return Response(content=body, media_type="application/json", headers=headers)
+
+
+group_view_cache = GroupViewCache()
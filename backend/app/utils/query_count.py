@@ -0,0 +1,76 @@
+# app/utils/query_count.py
+
+import contextvars
+import logging
+from typing import List, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Per-request [count] cell. A mutable cell rather than an int because DB calls
+# run in threadpool workers, which see a copy of the request's context: they
+# can't rebind the variable, but they can bump what it points to.
+_query_count: contextvars.ContextVar[Optional[List[int]]] = contextvars.ContextVar(
+    "query_count", default=None
+)
+
+
+def query_counting_enabled() -> bool:
+    """Counting is a dev aid (it adds a callback per statement/API call)."""
+    return settings.DEBUG
+
+
+def record_query(*_args, **_kwargs) -> None:
+    """
+    Count one DB round-trip against the current request. Installed as the
+    sqlite3 trace callback and as a botocore before-send handler (which
+    must return None so the request is still sent).
+    """
+    cell = _query_count.get()
+    if cell is not None:
+        cell[0] += 1
+
+
+def record_sqlite_statement(statement: str) -> None:
+    # Statements run by triggers are traced as "-- TRIGGER ..." comments;
+    # they're part of the outer statement, not extra round-trips
+    if not statement.startswith("--"):
+        record_query()
+
+
+class QueryCountMiddleware:
+    """
+    Reports how many DB queries (SQLite statements or DynamoDB API calls)
+    each request made, as an X-Query-Count header and a log line, so an
+    endpoint that starts querying per row shows up immediately.
+
+    The header counts queries made before the response started; queries
+    issued while streaming the body or by background tasks only reach
+    the log line.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cell = [0]
+        token = _query_count.set(cell)
+
+        async def send_with_count(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).append("X-Query-Count", str(cell[0]))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_count)
+        finally:
+            _query_count.reset(token)
+            logger.info("%s %s: %d queries", scope["method"], scope["path"], cell[0])
@@ -0,0 +1,61 @@
+# app/utils/rate_limit.py
+
+import threading
+import time
+from typing import Iterable, Tuple
+
+from cachetools import TTLCache
+
+
+class RateLimiter:
+    """
+    In-process fixed-window rate limiter.
+
+    limits is a list of (max_hits, window_seconds) pairs that all apply,
+    e.g. [(5, 60), (20, 3600)] for "5/minute;20/hour". Counters live in
+    this process only, so each worker/Lambda instance keeps its own budget.
+    """
+
+    def __init__(self, limits: Iterable[Tuple[int, int]], maxsize: int = 10_000):
+        self._windows = [
+            (max_hits, window, TTLCache(maxsize=maxsize, ttl=window))
+            for max_hits, window in limits
+        ]
+        self._lock = threading.Lock()
+
+    def _buckets(self, key: str):
+        now = time.time()
+        return [
+            (counts, (key, int(now // window)), max_hits)
+            for max_hits, window, counts in self._windows
+        ]
+
+    def hit(self, key: str) -> bool:
+        """
+        Record one hit for key. Returns False (and records nothing) if any
+        window is already exhausted.
+        """
+        with self._lock:
+            buckets = self._buckets(key)
+            if any(counts.get(bucket, 0) >= max_hits for counts, bucket, max_hits in buckets):
+                return False
+            for counts, bucket, _ in buckets:
+                counts[bucket] = counts.get(bucket, 0) + 1
+        return True
+
+    def exhausted(self, key: str) -> bool:
+        """True if any window for key is used up. Records nothing."""
+        with self._lock:
+            return any(
+                counts.get(bucket, 0) >= max_hits
+                for counts, bucket, max_hits in self._buckets(key)
+            )
+
+    def record(self, key: str) -> None:
+        """
+        Count one hit for key without checking the limits, for budgets
+        that only some outcomes (e.g. failed logins) should spend.
+        """
+        with self._lock:
+            for counts, bucket, _ in self._buckets(key):
+                counts[bucket] = counts.get(bucket, 0) + 1
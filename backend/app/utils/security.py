@@ -1,15 +1,61 @@
 # app/utils/security.py
 
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Dict, Any
+import asyncio
+import hashlib
+import threading
 
 import bcrypt       # direct bcrypt usage
 import jwt
+from cachetools import TTLCache
 
 from app.config import settings
 
 MAX_BCRYPT_LENGTH = 72
 
+# Recent verify_password results, keyed by a SHA-256 digest of hash + password
+# (never the plaintext). Failures are kept briefly so a client retrying a
+# wrong password doesn't burn a bcrypt round each time.
+_verify_ok_cache: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+_verify_fail_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
+_verify_cache_lock = threading.Lock()
+
+# Checked against when a login names an unknown user, so that path costs a
+# full bcrypt round too and response time doesn't reveal which emails exist
+DUMMY_PASSWORD_HASH = "$2b$12$nEOoqePDwjDPBOj/fMi61ux5twPAp/GP1OaLRTf3/VnLLSK..9O76"
+
+
+def _load_signing_key(secret: str) -> Any:
+    """
+    Turn the configured secret into the key object the JWT algorithm signs
+    with (bytes for HS*, a parsed private key for RS*/ES*/EdDSA PEMs).
+    """
+    return jwt.PyJWS().get_algorithm_by_name(settings.JWT_ALGORITHM).prepare_key(secret)
+
+
+def _verifying_key(signing_key: Any) -> Any:
+    """
+    The key tokens are checked against: the same bytes for HS*, the public
+    half of the private key for the asymmetric algorithms.
+    """
+    public_key = getattr(signing_key, "public_key", None)
+    return public_key() if public_key is not None else signing_key
+
+
+# Prepared once at import so issuing or verifying a token never re-parses the key
+_SIGNING_KEY = _load_signing_key(settings.JWT_SECRET_KEY)
+JWT_VERIFYING_KEY = _verifying_key(_SIGNING_KEY)
+_jwt = jwt.PyJWT()
+
+
+def token_cache_key(token: str) -> bytes:
+    """
+    Key for caches of verified tokens: a short digest, so bearer tokens
+    themselves are never kept in memory longer than the request.
+    """
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
 
 def _truncate_password(password: str) -> bytes:
     """
@@ -33,14 +79,47 @@ def hash_password(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     Verify a plaintext password against a bcrypt hash.
+    Results are cached for a few minutes so repeat logins skip bcrypt.
     """
     pw_bytes = _truncate_password(plain_password)
+    hash_bytes = hashed_password.encode("utf-8")
+    cache_key = hashlib.sha256(hash_bytes + b"|" + pw_bytes).digest()
+
+    with _verify_cache_lock:
+        if cache_key in _verify_ok_cache:
+            return True
+        if cache_key in _verify_fail_cache:
+            return False
+
     try:
-        return bcrypt.checkpw(pw_bytes, hashed_password.encode("utf-8"))
+        valid = bcrypt.checkpw(pw_bytes, hash_bytes)
     except ValueError:
         # If the stored hash is malformed, just fail verification
         return False
 
+    with _verify_cache_lock:
+        if valid:
+            _verify_ok_cache[cache_key] = True
+        else:
+            _verify_fail_cache[cache_key] = True
+    return valid
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    hash_password for async handlers: bcrypt runs in a worker thread
+    so it doesn't block the event loop.
+    """
+    return await asyncio.to_thread(hash_password, password)
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """
+    verify_password for async handlers: bcrypt runs in a worker thread
+    so it doesn't block the event loop.
+    """
+    return await asyncio.to_thread(verify_password, plain_password, hashed_password)
+
 
 def create_access_token(
     data: Dict[str, Any],
@@ -49,17 +128,13 @@ def create_access_token(
     """
     Create a JWT access token.
     """
-    to_encode = data.copy()
-
     if expires_delta is None:
         expires_delta = timedelta(hours=12)
 
-    expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire})
+    expire = datetime.now(timezone.utc) + expires_delta
 
-    encoded_jwt = jwt.encode(
-        to_encode,
-        settings.JWT_SECRET_KEY,
+    return _jwt.encode(
+        {**data, "exp": expire},
+        _SIGNING_KEY,
         algorithm=settings.JWT_ALGORITHM,
     )
-    return encoded_jwt
@@ -0,0 +1,60 @@
+import os
+
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+
+import pytest
+from starlette.applications import Starlette
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import PlainTextResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from app.config import Settings
+
+
+def _cors_client(cors_origins: str) -> TestClient:
+    settings = Settings(JWT_SECRET_KEY="test-secret", CORS_ORIGINS=cors_origins)
+    app = Starlette(routes=[Route("/", lambda request: PlainTextResponse("ok"))])
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.cors_origins,
+        allow_origin_regex=settings.cors_origin_regex,
+    )
+    return TestClient(app)
+
+
+def _allowed(client: TestClient, origin: str) -> bool:
+    response = client.get("/", headers={"Origin": origin})
+    return "access-control-allow-origin" in response.headers
+
+
+def test_bare_star_allows_every_origin():
+    settings = Settings(JWT_SECRET_KEY="test-secret", CORS_ORIGINS="*")
+    assert settings.cors_origins == frozenset({"*"})
+    assert settings.cors_origin_regex is None
+
+    client = _cors_client("*")
+    assert _allowed(client, "http://localhost:5173")
+    assert _allowed(client, "https://app.example.com")
+
+
+def test_plain_origin_is_matched_exactly():
+    client = _cors_client("http://localhost:5173")
+    assert _allowed(client, "http://localhost:5173")
+    assert not _allowed(client, "http://localhost:3000")
+    assert not _allowed(client, "https://app.example.com")
+
+
+@pytest.mark.parametrize(
+    "origin, allowed",
+    [
+        ("https://app.example.com", True),
+        ("https://example.com", False),
+        ("https://a.b.example.com", False),
+        ("http://app.example.com", False),
+        ("http://localhost:5173", True),
+    ],
+)
+def test_wildcard_subdomain_matches_one_label(origin, allowed):
+    client = _cors_client("http://localhost:5173,https://*.example.com")
+    assert _allowed(client, origin) is allowed
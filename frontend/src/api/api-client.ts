@@ -7,6 +7,9 @@ async function handleResponse<T>(response: Response): Promise<T> {
         const errorText = await response.text();
         throw new Error(errorText || `HTTP ${response.status}`);
     }
+    if (response.status === 204) {
+        return undefined as T;
+    }
     return response.json();
 }
 
@@ -159,7 +162,7 @@ export const membersAPI = {
             body: JSON.stringify({ role }),
         }).then(handleResponse),
 
-    remove: (memberId: string): Promise<{ ok: boolean; message: string }> =>
+    remove: (memberId: string): Promise<void> =>
         fetch(`${API_BASE_URL}/api/members/${memberId}`, {
             method: 'DELETE',
             headers: getAuthHeader(),
@@ -230,7 +233,7 @@ export const eventsAPI = {
             body: JSON.stringify(data),
         }).then(handleResponse),
 
-    delete: (eventId: string): Promise<{ ok: boolean; message: string }> =>
+    delete: (eventId: string): Promise<void> =>
         fetch(`${API_BASE_URL}/api/events/${eventId}`, {
             method: 'DELETE',
             headers: getAuthHeader(),